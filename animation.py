@@ -0,0 +1,106 @@
+import math
+import time
+
+__author__ = 'https://github.com/rafaiska'
+
+# Modo de animacao: o ponto de vista percorre uma orbita (ou um caminho qualquer de pontos de vista) e as projecoes
+# sao geradas quadro a quadro, a uma taxa alvo. Quadros que nao conseguem acompanhar a taxa sao descartados antes de
+# serem projetados. Nao depende do Tk: o desenho eh feito por uma funcao passada por parametro.
+
+DEFAULT_FPS = 30.0
+
+
+def orbitpath(radius, height, nframes, center=(0.0, 0.0), turns=1.0):
+    """Gera nframes pontos de vista igualmente espacados em uma orbita circular de raio radius em torno do eixo
+    paralelo a Z que passa por center (cx, cy), na altura Z=height. Como o plano de projecao eh Z=0, a orbita gira o
+    ponto de vista em torno do objeto sem nunca cruzar o plano de projecao (height nao deve ser 0)"""
+    for frame in range(nframes):
+        angle = 2.0 * math.pi * turns * frame / nframes
+        yield (center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle), height)
+
+
+class FrameStats(object):
+    """Estatisticas de uma animacao: latencia de projecao e de desenho de cada quadro, em segundos, e numero de
+    quadros descartados"""
+    def __init__(self):
+        self.projectiontimes = []
+        self.drawtimes = []
+        self.dropped = 0
+
+    def record(self, projectiontime, drawtime):
+        self.projectiontimes.append(projectiontime)
+        self.drawtimes.append(drawtime)
+
+    @staticmethod
+    def describe(times):
+        if not times:
+            return {'mean': 0.0, 'p95': 0.0, 'max': 0.0}
+        ordered = sorted(times)
+        return {'mean': sum(ordered) / len(ordered),
+                'p95': ordered[min(len(ordered) - 1, int(math.ceil(0.95 * len(ordered))) - 1)],
+                'max': ordered[-1]}
+
+    def summary(self):
+        """Resumo das latencias, incluindo qual etapa (projection ou draw) consumiu mais tempo no total"""
+        projection = self.describe(self.projectiontimes)
+        draw = self.describe(self.drawtimes)
+        return {'frames': len(self.projectiontimes), 'dropped': self.dropped,
+                'projection': projection, 'draw': draw,
+                'bottleneck': 'projection' if sum(self.projectiontimes) >= sum(self.drawtimes) else 'draw'}
+
+
+class Animation(object):
+    """Anima a projecao do objeto carregado em projector (um PerspectiveProjection) ao longo de path, um iteravel de
+    pontos de vista (x, y, z), a fps quadros por segundo. draw eh chamada com cada projecao; stats eh um FrameStats
+    onde as latencias sao registradas"""
+    def __init__(self, projector, path, fps=DEFAULT_FPS, draw=None, stats=None, clock=time.perf_counter):
+        self.projector = projector
+        self.path = iter(path)
+        self.period = 1.0 / fps
+        self.draw = draw
+        self.stats = stats if stats is not None else FrameStats()
+        self.clock = clock
+        self.start = None
+        self.frameindex = 0
+
+    def deadline(self, frameindex):
+        return self.start + frameindex * self.period
+
+    def schedule(self):
+        """Gerador dos pontos de vista a projetar, como tuplas (indice, ponto de vista). Os pontos de vista cujo horario
+        ja passou (o horario do quadro seguinte ja chegou) sao descartados. Permite que a projecao seja feita por outra
+        thread (ver view.MainView.animate)"""
+        if self.start is None:
+            self.start = self.clock()
+        for pointofview in self.path:
+            frameindex = self.frameindex
+            self.frameindex += 1
+            if self.clock() > self.deadline(frameindex + 1):
+                self.stats.dropped += 1
+                continue
+            yield frameindex, pointofview
+
+    def frames(self):
+        """Gerador de quadros. Cada quadro eh uma tupla (indice, ponto de vista, projecao, latencia da projecao). Os
+        pontos de vista atrasados sao descartados sem serem projetados (ver schedule)"""
+        for frameindex, pointofview in self.schedule():
+            began = self.clock()
+            projected = self.projector.getprojection(pointofview)
+            yield frameindex, pointofview, projected, self.clock() - began
+
+    def present(self, frame):
+        """Desenha um quadro gerado por frames e registra suas latencias"""
+        began = self.clock()
+        if self.draw is not None:
+            self.draw(frame[2])
+        self.stats.record(frame[3], self.clock() - began)
+
+    def run(self, sleep=time.sleep):
+        """Executa a animacao ate o fim do caminho, esperando o horario de cada quadro. Retorna o resumo das
+        estatisticas"""
+        for frame in self.frames():
+            delay = self.deadline(frame[0]) - self.clock()
+            if delay > 0:
+                sleep(delay)
+            self.present(frame)
+        return self.stats.summary()
@@ -0,0 +1,123 @@
+import time
+
+# Horario do inicio da importacao, para medir o tempo de importacao com --timings
+IMPORTSTARTED = time.perf_counter()
+
+import argparse
+import sys
+import numpy
+import projection
+
+__author__ = 'https://github.com/rafaiska'
+
+IMPORTSECONDS = time.perf_counter() - IMPORTSTARTED
+
+# Projecao em lote pela linha de comando, sem Tk e sem display: le um modelo e uma lista de pontos de vista (de um
+# arquivo ou da entrada padrao) e grava, para cada ponto de vista, as coordenadas 2D projetadas dos vertices e o
+# conjunto de faces visiveis, em NumPy binario (.npz) ou CSV. Como o programa pode ser executado milhares de vezes,
+# somente numpy e o nucleo de projecao sao importados; modelos no formato binario de meshfiles (.tdo) sao abertos com
+# memmap, sem conversao.
+#
+# Uso: python batchproject.py MODELO [--viewpoints ARQUIVO|-] [--output ARQUIVO|-] [--format npz|csv] [--timings]
+
+# Pontos de vista projetados de uma vez (ver PerspectiveProjection.getprojections). Limita a memoria dos blocos
+# (M, N, 2) no formato CSV, que eh gravado a medida que os blocos ficam prontos
+DEFAULT_CHUNKSIZE = 256
+
+CSVHEADER = 'viewpoint,kind,name,x,y\n'
+
+
+def projectviewpoints(projector, viewpoints, chunksize=DEFAULT_CHUNKSIZE):
+    """Gerador: projeta os pontos de vista em blocos de ate chunksize. Produz, para cada bloco, uma tupla (first,
+    projected, visiblefaces, visiblevertices), onde first eh o indice do primeiro ponto de vista do bloco e as matrizes
+    sao as de PerspectiveProjection.getprojections"""
+    viewpoints = numpy.asarray(viewpoints, dtype=float).reshape(-1, 3)
+    for first in range(0, len(viewpoints), chunksize):
+        yield (first,) + projector.getprojections(viewpoints[first:first + chunksize])
+
+
+def writenpz(outputfile, projector, viewpoints, chunksize=DEFAULT_CHUNKSIZE):
+    """Grava um arquivo .npz com as matrizes viewpoints (M, 3), projected (M, N, 2), visiblefaces (M, F) e
+    visiblevertices (M, N), e os nomes names (N,) dos vertices e facenames (F,) das faces, que dao a ordem das
+    colunas"""
+    tridiobject = projector.tridiobject
+    chunks = list(projectviewpoints(projector, viewpoints, chunksize))
+    nvertices = tridiobject.nvertices
+    nfaces = len(tridiobject.faceindices)
+    numpy.savez(outputfile,
+                viewpoints=numpy.asarray(viewpoints, dtype=float).reshape(-1, 3),
+                projected=numpy.concatenate([chunk[1] for chunk in chunks]) if chunks else
+                numpy.zeros((0, nvertices, 2)),
+                visiblefaces=numpy.concatenate([chunk[2] for chunk in chunks]) if chunks else
+                numpy.zeros((0, nfaces), dtype=bool),
+                visiblevertices=numpy.concatenate([chunk[3] for chunk in chunks]) if chunks else
+                numpy.zeros((0, nvertices), dtype=bool),
+                names=numpy.array(tridiobject.names, dtype=str),
+                facenames=numpy.array(list(tridiobject.faceindices), dtype=str))
+
+
+def writecsv(outputfile, projector, viewpoints, chunksize=DEFAULT_CHUNKSIZE):
+    """Grava uma tabela CSV com as colunas viewpoint, kind, name, x e y. Para cada ponto de vista (pelo seu indice na
+    entrada) ha uma linha kind=v por vertice visivel, com as suas coordenadas projetadas, e uma linha kind=f por face
+    visivel, com x e y vazios"""
+    tridiobject = projector.tridiobject
+    names = tridiobject.names
+    facenames = list(tridiobject.faceindices)
+    outputfile.write(CSVHEADER)
+    for first, projected, visiblefaces, visiblevertices in projectviewpoints(projector, viewpoints, chunksize):
+        lines = []
+        for offset in range(len(projected)):
+            index = first + offset
+            vertices = numpy.flatnonzero(visiblevertices[offset])
+            for vertex, (x, y) in zip(vertices.tolist(), projected[offset, vertices].tolist()):
+                lines.append('%d,v,%s,%r,%r\n' % (index, names[vertex], x, y))
+            for face in numpy.flatnonzero(visiblefaces[offset]).tolist():
+                lines.append('%d,f,%s,,\n' % (index, facenames[face]))
+        outputfile.write(''.join(lines))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Projeta um modelo a partir de uma lista de pontos de vista e grava '
+                                                 'as coordenadas 2D e as faces visiveis de cada um')
+    parser.add_argument('model', help='modelo (json, .tdo, .obj ou .ply)')
+    parser.add_argument('--viewpoints', default='-',
+                        help='arquivo com um ponto de vista "X Y Z" por linha, ou - para a entrada padrao (padrao)')
+    parser.add_argument('--output', default='-', help='arquivo de saida, ou - para a saida padrao (padrao)')
+    parser.add_argument('--format', choices=('npz', 'csv'), default=None,
+                        help='formato da saida (padrao: csv se o arquivo de saida terminar em .csv, senao npz)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--timings', action='store_true',
+                        help='mostra na saida de erros o tempo de importacao, carregamento, projecao e gravacao')
+    options = parser.parse_args(arguments)
+    outputformat = options.format
+    if outputformat is None:
+        outputformat = 'csv' if options.output.lower().endswith('.csv') else 'npz'
+
+    began = time.perf_counter()
+    projector = projection.PerspectiveProjection()
+    projector.loadtridiobject(options.model)
+    loaded = time.perf_counter()
+
+    if options.viewpoints == '-':
+        viewpoints = projection.readviewpoints(sys.stdin)
+    else:
+        with open(options.viewpoints, 'r') as viewpointsfile:
+            viewpoints = projection.readviewpoints(viewpointsfile)
+
+    writer = writecsv if outputformat == 'csv' else writenpz
+    if options.output == '-':
+        writer(sys.stdout if outputformat == 'csv' else sys.stdout.buffer, projector, viewpoints, options.chunksize)
+        sys.stdout.flush()
+    else:
+        with open(options.output, 'w' if outputformat == 'csv' else 'wb') as outputfile:
+            writer(outputfile, projector, viewpoints, options.chunksize)
+    finished = time.perf_counter()
+
+    if options.timings:
+        sys.stderr.write('importacao %.4fs, carregamento %.4fs, projecao e gravacao %.4fs (%d pontos de vista)\n'
+                         % (IMPORTSECONDS, loaded - began, finished - loaded, len(viewpoints)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
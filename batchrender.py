@@ -0,0 +1,137 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import projection
+import rasterizer
+import depthbuffer
+import meshfiles
+
+__author__ = 'https://github.com/rafaiska'
+
+# Renderizacao em lote: cada par (modelo, ponto de vista) eh um trabalho, distribuido entre os processos de um pool.
+# Os modelos sao convertidos uma unica vez para o formato binario de meshfiles e abertos pelos processos com
+# numpy.memmap, de modo que as matrizes da malha (inclusive as faces e os seus planos, gravados junto com o modelo)
+# sejam compartilhadas pelo cache de paginas do sistema em vez de serem serializadas para cada trabalho ou
+# recalculadas por cada processo. Os resultados chegam na ordem dos trabalhos, a medida que ficam prontos.
+
+# Trabalhos enviados de cada vez a um processo do pool
+DEFAULT_CHUNKSIZE = 4
+
+# Projetor carregado neste processo, por caminho do modelo binario. Os trabalhos chegam modelo a modelo, entao somente
+# o ultimo modelo eh mantido; batchrender o descarta ao terminar
+workerprojectors = {}
+
+
+def preparemodel(objectpath, directory):
+    """Retorna o caminho do modelo no formato binario, com os planos das faces. Modelos em outros formatos, ou
+    gravados sem os planos, sao convertidos para directory"""
+    if meshfiles.isbinary(objectpath) and 'facenormals' in meshfiles.readbinary(objectpath):
+        return objectpath
+    basename = os.path.splitext(os.path.basename(objectpath))[0]
+    binarypath = os.path.join(directory, '%d_%s%s' % (len(os.listdir(directory)), basename, meshfiles.BINEXTENSION))
+    projection.loadmodel(objectpath).savebinary(binarypath)
+    return binarypath
+
+
+def workerprojector(binarypath):
+    """Projetor do modelo binarypath neste processo. O modelo eh aberto (com memmap) uma unica vez por processo, e o
+    modelo anterior eh descartado"""
+    projector = workerprojectors.get(binarypath)
+    if projector is None:
+        workerprojectors.clear()
+        projector = workerprojectors[binarypath] = projection.PerspectiveProjection()
+        projector.loadtridiobject(binarypath)
+    return projector
+
+
+def renderjob(job):
+    """Executa um trabalho (binarypath, pointofview, outputpath, width, height, hiddenlines): projeta o modelo,
+    rasteriza a projecao e grava a imagem, se outputpath nao for None. Com hiddenlines, as linhas ocultas por outras
+    partes do modelo sao removidas pelo buffer de profundidade (ver depthbuffer). Retorna um dicionario com o
+    resultado; sem hiddenlines, ele traz tambem o numero de vertices e arestas desenhados"""
+    binarypath, pointofview, outputpath, width, height, hiddenlines = job
+    began = time.perf_counter()
+    projector = workerprojector(binarypath)
+    result = {'output': outputpath, 'process': os.getpid()}
+    if hiddenlines:
+        image = depthbuffer.render(projector, pointofview, width, height)
+    else:
+        # A projecao fica como mascara sobre a topologia do modelo carregado, que eh reaproveitado por todos os
+        # trabalhos
+        projected = projector.getmaskedprojection(pointofview)
+        image = rasterizer.render(projected, width, height)
+        result.update(vertices=projected.nvertices, edges=projected.nedges())
+    if outputpath is not None:
+        rasterizer.writeimage(outputpath, image)
+    result['seconds'] = time.perf_counter() - began
+    return result
+
+
+def batchrender(models, viewpoints, outputdir=None, extension='.png', processes=None, chunksize=DEFAULT_CHUNKSIZE,
+                width=rasterizer.SCREEN_WIDTH, height=rasterizer.SCREEN_HEIGHT, hiddenlines=False):
+    """Renderiza cada modelo de models a partir de cada ponto de vista de viewpoints, em um pool de processes
+    processos (por padrao, um por nucleo). Gerador: produz os resultados de renderjob na ordem modelo a modelo, ponto
+    de vista a ponto de vista. As imagens sao gravadas em outputdir como MODELO_INDICE.extension; se outputdir for
+    None, elas sao apenas rasterizadas. Com hiddenlines, as linhas ocultas sao removidas (ver renderjob)"""
+    if outputdir is not None:
+        os.makedirs(outputdir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as directory:
+        binarypaths = [preparemodel(objectpath, directory) for objectpath in models]
+        jobs = []
+        for objectpath, binarypath in zip(models, binarypaths):
+            basename = os.path.splitext(os.path.basename(objectpath))[0]
+            for index, pointofview in enumerate(viewpoints):
+                outputpath = None
+                if outputdir is not None:
+                    outputpath = os.path.join(outputdir, '%s_%04d%s' % (basename, index, extension))
+                jobs.append((binarypath, tuple(pointofview), outputpath, width, height, hiddenlines))
+
+        if processes == 1:
+            try:
+                for job in jobs:
+                    yield renderjob(job)
+            finally:
+                # Os projetores deste processo usam os modelos de directory, que sera removido
+                workerprojectors.clear()
+            return
+        with multiprocessing.Pool(processes) as pool:
+            for result in pool.imap(renderjob, jobs, chunksize):
+                yield result
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Renderiza em lote modelos a partir de um conjunto de pontos de vista')
+    parser.add_argument('models', nargs='+', help='modelos (json, .tdo, .obj ou .ply)')
+    parser.add_argument('--viewpoints', required=True,
+                        help='arquivo com um ponto de vista "X Y Z" por linha, ou - para a entrada padrao')
+    parser.add_argument('--output', help='diretorio das imagens (se omitido, as imagens nao sao gravadas)')
+    parser.add_argument('--format', choices=('png', 'ppm'), default='png')
+    parser.add_argument('--processes', type=int, default=None, help='processos do pool (padrao: um por nucleo)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--hiddenlines', action='store_true',
+                        help='remove as linhas ocultas por outras partes do modelo (buffer de profundidade)')
+    options = parser.parse_args(arguments)
+
+    if options.viewpoints == '-':
+        viewpoints = projection.readviewpoints(sys.stdin)
+    else:
+        with open(options.viewpoints, 'r') as viewpointsfile:
+            viewpoints = projection.readviewpoints(viewpointsfile)
+
+    began = time.perf_counter()
+    count = 0
+    for result in batchrender(options.models, viewpoints, options.output, '.' + options.format, options.processes,
+                              options.chunksize, hiddenlines=options.hiddenlines):
+        count += 1
+        counts = ' %d vertices %d arestas' % (result['vertices'], result['edges']) if 'vertices' in result else ''
+        print('%s%s %.4fs' % (result['output'] or '-', counts, result['seconds']))
+    elapsed = time.perf_counter() - began
+    print('%d imagens em %.2fs (%.1f imagens/s)' % (count, elapsed, count / elapsed if elapsed else 0.0))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,268 @@
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy
+import projection
+import rasterizer
+import meshfiles
+
+__author__ = 'https://github.com/rafaiska'
+
+# Suite de benchmarks: gera figuras parametricas no mesmo esquema json de cubo.json e objeto.json (cubos subdivididos,
+# esferas UV e extrusoes concavas), de 10 a 1M de vertices, e mede separadamente cada etapa do pipeline de projecao.
+# Os resultados podem ser gravados e comparados com um arquivo de referencia (baseline).
+
+SHAPES = ('cube', 'sphere', 'extrusion')
+SIZES = (10, 100, 1000, 10000, 100000, 1000000)
+STAGES = ('loadfromjson', 'numpymatrix', 'loadfromnumpymatrix', 'detecthiddenfaces', 'getprojection', 'render',
+          'drawprojection')
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 1.25
+
+
+def subdividedcube(nvertices, side=6.0):
+    """Cubo de lado side com cada face subdividida em n x n quadrilateros, com n escolhido para que o total de vertices
+    (6n^2 + 2) fique proximo de nvertices. Retorna (coords (N, 3), faces (lista de listas de indices))"""
+    n = max(1, int(round(math.sqrt(max(nvertices - 2, 6) / 6.0))))
+    lattice = numpy.stack(numpy.meshgrid(*([numpy.arange(n + 1)] * 3), indexing='ij'), axis=-1).reshape(-1, 3)
+    onsurface = ((lattice == 0) | (lattice == n)).any(axis=1)
+    index = numpy.full(len(lattice), -1)
+    index[onsurface] = numpy.arange(onsurface.sum())
+    index = index.reshape(n + 1, n + 1, n + 1)
+    coords = lattice[onsurface] * (side / n)
+
+    faces = []
+    j, k = numpy.meshgrid(numpy.arange(n), numpy.arange(n), indexing='ij')
+    j, k = j.ravel(), k.ravel()
+    for axis in range(3):
+        axis1, axis2 = (axis + 1) % 3, (axis + 2) % 3
+        for value in (0, n):
+            def corner(dj, dk):
+                position = [None, None, None]
+                position[axis] = numpy.full(len(j), value)
+                position[axis1] = j + dj
+                position[axis2] = k + dk
+                return index[position[0], position[1], position[2]]
+            # Vertices em sentido anti-horario vistos de fora: a normal da face aponta para fora do cubo
+            quads = numpy.stack((corner(0, 0), corner(1, 0), corner(1, 1), corner(0, 1)), axis=1)
+            if value == 0:
+                quads = quads[:, ::-1]
+            faces.extend(quads.tolist())
+    return coords, faces
+
+
+def uvsphere(nvertices, radius=3.0):
+    """Esfera UV com R aneis e 2R meridianos, R escolhido para que o total de vertices fique proximo de nvertices"""
+    rings = max(2, int(round(math.sqrt(max(nvertices, 4) / 2.0))))
+    segments = 2 * rings
+    theta = numpy.pi * numpy.arange(1, rings) / rings
+    phi = 2.0 * numpy.pi * numpy.arange(segments) / segments
+    theta, phi = numpy.meshgrid(theta, phi, indexing='ij')
+    body = numpy.stack((numpy.sin(theta) * numpy.cos(phi), numpy.sin(theta) * numpy.sin(phi), numpy.cos(theta)),
+                       axis=-1).reshape(-1, 3)
+    coords = numpy.vstack(([0.0, 0.0, 1.0], body, [0.0, 0.0, -1.0])) * radius
+    south = len(coords) - 1
+
+    def ring(r):
+        return 1 + r * segments + numpy.arange(segments)
+
+    nextsegment = numpy.roll(numpy.arange(segments), -1)
+    faces = numpy.stack((numpy.zeros(segments, dtype=int), ring(0), ring(0)[nextsegment]), axis=1).tolist()
+    for r in range(rings - 2):
+        upper, lower = ring(r), ring(r + 1)
+        faces.extend(numpy.stack((upper, lower, lower[nextsegment], upper[nextsegment]), axis=1).tolist())
+    last = ring(rings - 2)
+    faces.extend(numpy.stack((numpy.full(segments, south), last[nextsegment], last), axis=1).tolist())
+    return coords, faces
+
+
+def concaveextrusion(nvertices, radius=3.0, height=6.0):
+    """Estrela (poligono concavo) extrudada ao longo de Z, com as laterais divididas em camadas. As tampas sao faces
+    unicas com todos os vertices do contorno, como as faces de seis vertices de objeto.json"""
+    spikes = max(3, int(math.sqrt(max(nvertices, 12) / 2.0) / 2))
+    layers = max(1, int(round(nvertices / (2.0 * spikes))) - 1)
+    outline = 2 * spikes
+    # O contorno comeca em um vertice interno, de modo que os tres primeiros vertices das tampas formem um canto
+    # convexo e a normal calculada a partir deles aponte para fora
+    angle = 2.0 * numpy.pi * (numpy.arange(outline) + 1) / outline
+    radii = numpy.where(numpy.arange(outline) % 2 == 0, radius * 0.4, radius)
+    polygon = numpy.stack((radii * numpy.cos(angle), radii * numpy.sin(angle)), axis=1)
+    z = numpy.linspace(0.0, height, layers + 1)
+    coords = numpy.hstack((numpy.tile(polygon, (layers + 1, 1)), numpy.repeat(z, outline)[:, None]))
+
+    following = numpy.roll(numpy.arange(outline), -1)
+    faces = []
+    for layer in range(layers):
+        lower = layer * outline + numpy.arange(outline)
+        upper = lower + outline
+        faces.extend(numpy.stack((lower, lower[following], upper[following], upper), axis=1).tolist())
+    faces.append(list(range(layers * outline, (layers + 1) * outline)))
+    faces.append([0] + list(range(outline - 1, 0, -1)))
+    return coords, faces
+
+
+GENERATORS = {'cube': subdividedcube, 'sphere': uvsphere, 'extrusion': concaveextrusion}
+
+
+def tojsonschema(coords, faces):
+    """Monta o dicionario no esquema json de objeto.json: vertices v1..vN, arestas derivadas das faces (listadas nos
+    dois sentidos) e faces f1..fF"""
+    names = ['v%d' % (i + 1) for i in range(len(coords))]
+    faceoffsets = numpy.cumsum([0] + [len(face) for face in faces])
+    edges = meshfiles.edgesfromfaces(faceoffsets, [i for face in faces for i in face]).tolist()
+    adjacency = {name: [] for name in names}
+    for src, dst in edges:
+        adjacency[names[src]].append(names[dst])
+        adjacency[names[dst]].append(names[src])
+    return {'vertices': dict(zip(names, coords.tolist())),
+            'edges': adjacency,
+            'faces': {'f%d' % (i + 1): [names[index] for index in face] for i, face in enumerate(faces)}}
+
+
+def makemodel(shape, nvertices, directory):
+    """Gera a figura e grava em directory no esquema json. Retorna o caminho do arquivo"""
+    coords, faces = GENERATORS[shape](nvertices)
+    path = os.path.join(directory, '%s_%d.json' % (shape, nvertices))
+    with open(path, 'w') as objfile:
+        json.dump(tojsonschema(coords, faces), objfile)
+    return path
+
+
+def pointofviewfor(tridiobject):
+    """Ponto de vista afastado do objeto, fora de sua caixa envolvente e acima dela em Z"""
+    lower, upper = tridiobject.bounds()
+    size = float(numpy.max(upper - lower))
+    center = (lower + upper) / 2.0
+    return float(center[0] + 1.5 * size), float(center[1] + 1.2 * size), float(upper[2] + 3.0 * size)
+
+
+def measure(function, repeat):
+    """Executa function repeat vezes e retorna o menor tempo, em segundos, e o pico de memoria alocada em uma execucao
+    adicional acompanhada pelo tracemalloc, em bytes"""
+    best = math.inf
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - began)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def tkview():
+    """Retorna uma janela view.MainView escondida para medir drawprojection, ou None se nao houver display"""
+    try:
+        import view
+        mainview = view.MainView()
+        mainview.withdraw()
+        return mainview
+    except Exception:
+        return None
+
+
+def benchmarkmodel(path, repeat, mainview=None):
+    """Mede cada etapa do pipeline para a figura gravada em path. Retorna um dicionario etapa -> resultados"""
+    results = {}
+    loaded = projection.TriDObject()
+
+    def loadstage():
+        tridiobject = projection.TriDObject()
+        tridiobject.loadfromjson(path)
+        return tridiobject
+    stages = [('loadfromjson', loadstage)]
+    loaded.loadfromjson(path)
+    pointofview = pointofviewfor(loaded)
+    projector = projection.PerspectiveProjection()
+    projector.tridiobject = loaded
+    perspectivematrix = projector.perspectivematrix(pointofview)
+    matrix = loaded.numpymatrix()
+    perspectiveresults = perspectivematrix * matrix
+    projected = projector.getprojection(pointofview)
+
+    stages.append(('numpymatrix', loaded.numpymatrix))
+    stages.append(('loadfromnumpymatrix',
+                   lambda: projection.TriDObject().loadfromnumpymatrix(loaded, perspectiveresults)))
+    stages.append(('detecthiddenfaces', lambda: projector.detecthiddenfaces(pointofview)))
+    stages.append(('getprojection', lambda: projector.getprojection(pointofview)))
+    stages.append(('render', lambda: rasterizer.render(projected)))
+    if mainview is not None:
+        stages.append(('drawprojection', lambda: (mainview.clearprojection(), mainview.drawprojection(projected),
+                                                  mainview.update_idletasks())))
+
+    for stage, function in stages:
+        seconds, peak = measure(function, repeat)
+        results[stage] = {'seconds': seconds, 'verticespersecond': loaded.nvertices / seconds if seconds else math.inf,
+                          'peakbytes': peak}
+    return loaded.nvertices, len(loaded.faceindices), results
+
+
+def compare(results, baseline, threshold):
+    """Compara os tempos com os do arquivo de referencia. Retorna as linhas do relatorio e o numero de regressoes
+    (etapas mais lentas que threshold vezes o tempo de referencia)"""
+    lines = []
+    regressions = 0
+    for key, entry in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        for stage, measured in entry['stages'].items():
+            if stage not in reference['stages']:
+                continue
+            ratio = measured['seconds'] / max(reference['stages'][stage]['seconds'], 1e-12)
+            flag = 'REGRESSAO' if ratio > threshold else ''
+            regressions += bool(flag)
+            lines.append('%-18s %-20s %8.2fx %s' % (key, stage, ratio, flag))
+    return lines, regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Benchmarks do pipeline de projecao perspectiva')
+    parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES[:-1]),
+                        help='numero aproximado de vertices de cada figura (padrao: %s)' % list(SIZES[:-1]))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--tk', action='store_true', help='mede tambem MainView.drawprojection (precisa de display)')
+    parser.add_argument('--save', help='grava os resultados neste arquivo json')
+    parser.add_argument('--compare', help='compara os resultados com este arquivo json de referencia')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    options = parser.parse_args(arguments)
+
+    mainview = tkview() if options.tk else None
+    results = {}
+    print('%-18s %10s %8s %-20s %12s %14s %10s' % ('figura', 'vertices', 'faces', 'etapa', 'segundos', 'vertices/s',
+                                                   'pico MB'))
+    with tempfile.TemporaryDirectory() as directory:
+        for shape in options.shapes:
+            for size in options.sizes:
+                path = makemodel(shape, size, directory)
+                nvertices, nfaces, stages = benchmarkmodel(path, options.repeat, mainview)
+                os.remove(path)
+                key = '%s_%d' % (shape, size)
+                results[key] = {'vertices': nvertices, 'faces': nfaces, 'stages': stages}
+                for stage in STAGES:
+                    if stage in stages:
+                        measured = stages[stage]
+                        print('%-18s %10d %8d %-20s %12.6f %14.0f %10.2f' % (
+                            key, nvertices, nfaces, stage, measured['seconds'], measured['verticespersecond'],
+                            measured['peakbytes'] / 2.0 ** 20))
+
+    if options.save:
+        with open(options.save, 'w') as resultsfile:
+            json.dump(results, resultsfile, indent=2)
+    if options.compare:
+        with open(options.compare, 'r') as baselinefile:
+            baseline = json.load(baselinefile)
+        lines, regressions = compare(results, baseline, options.threshold)
+        print('\n'.join(lines))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,151 @@
+import numpy
+
+__author__ = 'https://github.com/rafaiska'
+
+# Camera da projecao perspectiva: ponto de vista, plano de projecao (dado por um vetor normal e um ponto) e,
+# opcionalmente, um viewport.Viewport. As matrizes sao montadas uma unica vez e guardadas ate que algum parametro mude,
+# de modo que redesenhar a partir de uma camera parada nao reconstroi nenhuma matriz.
+
+# Direcao usada como "para cima" no plano de projecao, ao montar os seus eixos u e v. Para o plano Z=0, u = x e v = y
+UP = (0.0, 1.0, 0.0)
+
+
+class Camera(object):
+    """self.viewpoint: ponto de vista (a, b, c)
+
+    self.planenormal e self.planepoint: vetor normal (nx, ny, nz) e um ponto (x0, y0, z0) do plano de projecao. O
+    padrao eh o plano Z=0
+
+    self.viewport: viewport.Viewport opcional, que leva as coordenadas do plano de projecao (eixos u e v, ver axes) as
+    coordenadas do dispositivo
+
+    Os parametros devem ser alterados pelos metodos setviewpoint, setplane e setviewport, que descartam as matrizes
+    guardadas somente quando o valor muda"""
+    def __init__(self, viewpoint=None, planenormal=(0.0, 0.0, 1.0), planepoint=(0.0, 0.0, 0.0), viewport=None):
+        self.viewpoint = None
+        self.planenormal = None
+        self.planepoint = None
+        self.viewport = viewport
+        self.matrices = {}
+        # Incrementada sempre que algum parametro muda
+        self.version = 0
+        self.setplane(planenormal, planepoint)
+        if viewpoint is not None:
+            self.setviewpoint(viewpoint)
+
+    def setviewpoint(self, viewpoint):
+        viewpoint = tuple(float(coordinate) for coordinate in viewpoint)
+        if viewpoint != self.viewpoint:
+            self.viewpoint = viewpoint
+            self.invalidate()
+
+    def setplane(self, planenormal, planepoint=(0.0, 0.0, 0.0)):
+        planenormal = tuple(float(coordinate) for coordinate in planenormal)
+        planepoint = tuple(float(coordinate) for coordinate in planepoint)
+        if not any(planenormal):
+            raise ValueError('O vetor normal do plano de projecao nao pode ser nulo')
+        if planenormal != self.planenormal or planepoint != self.planepoint:
+            self.planenormal = planenormal
+            self.planepoint = planepoint
+            self.invalidate()
+
+    def setviewport(self, viewport):
+        if viewport is not self.viewport:
+            self.viewport = viewport
+            self.invalidate()
+
+    def invalidate(self):
+        self.matrices = {}
+        self.version += 1
+
+    def isdefaultplane(self):
+        """Verifica se o plano de projecao eh o plano Z=0 com normal (0, 0, 1), usado por padrao em todo o pacote"""
+        return self.planenormal == (0.0, 0.0, 1.0) and self.planepoint[2] == 0.0
+
+    def planekey(self):
+        """Tupla que identifica o plano de projecao, para ser usada em chaves de cache"""
+        return self.planenormal + self.planepoint
+
+    def cached(self, name, build):
+        matrix = self.matrices.get(name)
+        if matrix is None:
+            matrix = self.matrices[name] = build()
+        return matrix
+
+    def perspectivematrix(self):
+        """Matriz perspectiva 4x4 que projeta os pontos, a partir do ponto de vista, sobre o plano de projecao. Os
+        resultados continuam em coordenadas do mundo, sobre o plano"""
+        return self.cached('perspective', lambda: perspectivematrices([self.viewpoint], self.planenormal,
+                                                                       self.planepoint)[0])
+
+    def axes(self):
+        """Eixos u e v do plano de projecao, vetores unitarios ortogonais. v eh a direcao UP projetada no plano (ou Z,
+        se UP for perpendicular ao plano) e u = v x n"""
+        return self.cached('axes', lambda: planeaxes(self.planenormal))
+
+    def planematrix(self):
+        """Matriz 4x4 que leva pontos do plano de projecao as suas coordenadas (u, v) no plano, em x e y, com z=0"""
+        def build():
+            u, v = self.axes()
+            origin = numpy.asarray(self.planepoint)
+            matrix = numpy.zeros((4, 4))
+            matrix[0, :3] = u
+            matrix[0, 3] = - u @ origin
+            matrix[1, :3] = v
+            matrix[1, 3] = - v @ origin
+            matrix[3, 3] = 1.0
+            return matrix
+        return self.cached('plane', build)
+
+    def projectionmatrix(self):
+        """Matriz 4x4 combinada (plano x perspectiva): leva as coordenadas do mundo as coordenadas (u, v) no plano de
+        projecao, em x e y, com z=0. Para o plano Z=0 ela eh igual a matriz perspectiva"""
+        return self.cached('projection', lambda: self.planematrix() @ self.perspectivematrix())
+
+    def devicematrix(self):
+        """Matriz 3x4 combinada (viewport x plano x perspectiva): leva as coordenadas homogeneas do mundo as coordenadas
+        homogeneas (x, y, w) do dispositivo. Exige self.viewport"""
+        def build():
+            projection = self.projectionmatrix()[[0, 1, 3]]
+            if self.viewport is None:
+                return projection
+            return self.viewport.matrix @ projection
+        return self.cached('device', build)
+
+    def project(self, coords):
+        """Projeta a matriz (N, 4) de coordenadas homogeneas do mundo, em uma unica multiplicacao pela matriz combinada.
+        Retorna a matriz (N, 2) de coordenadas do dispositivo (ou do plano de projecao, se nao houver viewport)"""
+        results = numpy.asarray(coords, dtype=float) @ self.devicematrix().T
+        return results[:, :2] / results[:, 2:3]
+
+
+def planeaxes(planenormal, up=UP):
+    normal = numpy.asarray(planenormal, dtype=float)
+    normal = normal / numpy.linalg.norm(normal)
+    for direction in (up, (0.0, 0.0, 1.0)):
+        v = numpy.asarray(direction, dtype=float)
+        v = v - (v @ normal) * normal
+        length = numpy.linalg.norm(v)
+        if length > 1e-12:
+            v = v / length
+            return numpy.cross(v, normal), v
+    raise ValueError('Nao foi possivel montar os eixos do plano de projecao')
+
+
+def perspectivematrices(viewpoints, planenormal=(0.0, 0.0, 1.0), planepoint=(0.0, 0.0, 0.0)):
+    """Monta de uma so vez as matrizes perspectiva de uma matriz (M, 3) de pontos de vista sobre o plano de projecao
+    dado por planenormal e planepoint. Retorna um tensor (M, 4, 4)"""
+    viewpoints = numpy.asarray(viewpoints, dtype=float).reshape(-1, 3)
+    normal = numpy.asarray(planenormal, dtype=float)
+
+    # d0 eh calculado a partir de um ponto (x0, y0, z0) do plano de projecao; d1 depende do ponto de vista
+    d0 = float(numpy.asarray(planepoint, dtype=float) @ normal)
+    d1 = viewpoints @ normal
+    d = d0 - d1
+
+    matrices = numpy.zeros((viewpoints.shape[0], 4, 4))
+    matrices[:, :3, :3] = d[:, None, None] * numpy.eye(3) + viewpoints[:, :, None] * normal[None, None, :]
+    matrices[:, :3, 3] = - viewpoints * d0
+    matrices[:, 3, :3] = normal
+    matrices[:, 3, 3] = - d1
+    return matrices
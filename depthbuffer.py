@@ -0,0 +1,240 @@
+import numpy
+import rasterizer
+from viewport import Viewport, finitebounds
+
+__author__ = 'https://github.com/rafaiska'
+
+# Remocao de linhas ocultas por z-buffer, sem Tk. As faces visiveis (que passam pelo teste de faces ocultas) sao
+# rasterizadas de uma so vez em um buffer de profundidade do tamanho da tela, e cada aresta eh amostrada pixel a pixel
+# (como em rasterizer.rasterizelines) e comparada com o buffer, sendo dividida em trechos visiveis e ocultos. O custo eh
+# proporcional a area da tela coberta pelas faces, e nao ao numero de pares de faces, e o resultado eh correto tambem
+# para objetos concavos como objeto.json, em que faces de frente podem ser cobertas por outras partes do objeto.
+#
+# A profundidade guardada eh q = d / w, onde w eh a coordenada homogenea da projecao e d a distancia (na escala do
+# vetor normal) do ponto de vista ao plano de projecao: q vale 1 sobre o plano, eh maior para pontos mais proximos do
+# ponto de vista e varia linearmente nas coordenadas de tela ao longo de cada face plana.
+
+# Tolerancia relativa da comparacao de profundidade entre uma amostra de aresta e o buffer
+DEPTHEPSILON = 1e-3
+
+# Numero maximo aproximado de pixels candidatos gerados de uma vez na rasterizacao das faces
+MAXSAMPLES = 1 << 22
+
+
+def faceplanes(xy, depth, faceoffsets, faceindices, faces):
+    """Coeficientes (qa, qb, qc) da profundidade q = qa * x + qb * y + qc de cada face selecionada, nas coordenadas de
+    tela. Cada face eh plana, e os coeficientes sao calculados a partir do triangulo de maior area do leque que parte
+    do seu primeiro vertice. Retorna uma matriz (F, 3)"""
+    lengths = numpy.diff(faceoffsets)[faces]
+    starts = faceoffsets[:-1][faces]
+    counts = numpy.maximum(lengths - 2, 0)
+    owner = numpy.repeat(numpy.arange(len(faces)), counts)
+    position = numpy.arange(counts.sum()) - (numpy.cumsum(counts) - counts)[owner]
+    first = starts[owner]
+    p0 = faceindices[first]
+    p1 = faceindices[first + position + 1]
+    p2 = faceindices[first + position + 2]
+    e1 = xy[p1] - xy[p0]
+    e2 = xy[p2] - xy[p0]
+    area = e1[:, 0] * e2[:, 1] - e2[:, 0] * e1[:, 1]
+
+    # Triangulo de maior area de cada face
+    best = numpy.zeros(len(faces), dtype=numpy.intp)
+    order = numpy.lexsort((numpy.abs(area), owner))
+    last = numpy.r_[owner[order][1:] != owner[order][:-1], True] if len(order) else numpy.zeros(0, dtype=bool)
+    best[owner[order][last]] = order[last]
+    planes = numpy.zeros((len(faces), 3))
+    hasarea = numpy.zeros(len(faces), dtype=bool)
+    hasarea[owner[order][last]] = area[order][last] != 0
+    if not hasarea.any():
+        return planes
+    best = best[hasarea]
+    d1 = depth[p1[best]] - depth[p0[best]]
+    d2 = depth[p2[best]] - depth[p0[best]]
+    qa = (d1 * e2[best, 1] - d2 * e1[best, 1]) / area[best]
+    qb = (d2 * e1[best, 0] - d1 * e2[best, 0]) / area[best]
+    origin = xy[p0[best]]
+    planes[hasarea] = numpy.stack((qa, qb, depth[p0[best]] - qa * origin[:, 0] - qb * origin[:, 1]), axis=1)
+    # Faces sem area na tela (vistas de perfil) ficam com a profundidade do primeiro vertice
+    planes[~hasarea, 2] = depth[faceindices[starts[~hasarea]]]
+    return planes
+
+
+def facespans(xy, faceoffsets, faceindices, faces, width, height):
+    """Preenchimento por linhas de varredura: cada lado de cada face selecionada eh intersectado com as linhas y
+    inteiras que ele atravessa (o intervalo de y de cada lado eh semiaberto, para que um vertice nao seja contado duas
+    vezes) e as intersecoes de cada face em cada linha sao ordenadas e tomadas duas a duas (regra par-impar), o que
+    vale tambem para faces concavas. Retorna uma tupla (owner, rows, xstart, xend) com a face, a linha e os pixels
+    [xstart, xend] de cada trecho, ja limitados a tela"""
+    lengths = numpy.diff(faceoffsets)[faces]
+    starts = faceoffsets[:-1][faces]
+    owner = numpy.repeat(numpy.arange(len(faces)), lengths)
+    entries = starts[owner] + numpy.arange(lengths.sum()) - (numpy.cumsum(lengths) - lengths)[owner]
+    following = entries + 1
+    last = numpy.cumsum(lengths)[lengths > 0] - 1
+    following[last] = starts[lengths > 0]
+    a = xy[faceindices[entries]]
+    b = xy[faceindices[following]]
+
+    # Linhas atravessadas por cada lado: ceil(ymin) <= y < ceil(ymax), dentro da tela
+    top = numpy.minimum(a[:, 1], b[:, 1])
+    bottom = numpy.maximum(a[:, 1], b[:, 1])
+    firstrow = numpy.maximum(numpy.ceil(top), 0).astype(numpy.intp)
+    lastrow = numpy.minimum(numpy.ceil(bottom), height).astype(numpy.intp)
+    counts = numpy.maximum(lastrow - firstrow, 0)
+    side = numpy.repeat(numpy.arange(len(a)), counts)
+    rows = firstrow[side] + numpy.arange(counts.sum()) - (numpy.cumsum(counts) - counts)[side]
+    slope = (b[side, 0] - a[side, 0]) / (b[side, 1] - a[side, 1])
+    x = a[side, 0] + (rows - a[side, 1]) * slope
+
+    # Intersecoes de cada face em cada linha, em ordem de x, tomadas duas a duas
+    owner = owner[side]
+    order = numpy.lexsort((x, rows, owner))
+    owner = owner[order][0::2]
+    rows = rows[order][0::2]
+    x = x[order]
+    xstart = numpy.maximum(numpy.ceil(x[0::2]), 0).astype(numpy.intp)
+    xend = numpy.minimum(numpy.ceil(x[1::2]) - 1, width - 1).astype(numpy.intp)
+    return owner, rows, xstart, xend
+
+
+def rasterizefaces(xy, depth, faceoffsets, faceindices, width, height, faces=None):
+    """Rasteriza as faces em um buffer de profundidade width x height. xy eh a matriz (N, 2) de coordenadas de tela dos
+    vertices e depth a matriz (N,) de profundidades q (ver acima); faces, se passada, seleciona por indices as faces
+    rasterizadas. As faces podem ter qualquer numero de vertices e ser concavas (ver facespans).
+
+    Retorna uma tupla (depthbuffer, facebuffer) de matrizes (height, width): a maior profundidade q de cada pixel (0
+    onde nenhuma face o cobre) e o indice da face mais proxima (-1 onde nenhuma face o cobre)"""
+    depthbuffer = numpy.zeros(height * width)
+    facebuffer = numpy.full(height * width, -1, dtype=numpy.intp)
+    faces = numpy.arange(len(faceoffsets) - 1) if faces is None else numpy.asarray(faces, dtype=numpy.intp)
+    # Faces com algum vertice atras do ponto de vista, ou na sua profundidade (coordenadas infinitas), nao tem
+    # profundidade definida
+    lengths = numpy.diff(faceoffsets)
+    behind = numpy.zeros(len(lengths), dtype=bool)
+    facedepth = depth[faceindices]
+    defined = (facedepth > 0) & numpy.isfinite(facedepth) & numpy.isfinite(xy[faceindices]).all(axis=1)
+    behind[numpy.repeat(numpy.arange(len(lengths)), lengths)[~ defined]] = True
+    faces = faces[~behind[faces] & (lengths[faces] >= 3)]
+    if not len(faces):
+        return depthbuffer.reshape(height, width), facebuffer.reshape(height, width)
+
+    planes = faceplanes(xy, depth, faceoffsets, faceindices, faces)
+    owner, rows, xstart, xend = facespans(xy, faceoffsets, faceindices, faces, width, height)
+    counts = numpy.maximum(xend - xstart + 1, 0)
+
+    # Os trechos sao processados em blocos de ate MAXSAMPLES pixels (ou um unico trecho, se for maior)
+    cumulative = numpy.cumsum(counts)
+    begin = 0
+    while begin < len(counts):
+        done = cumulative[begin - 1] if begin else 0
+        end = max(int(numpy.searchsorted(cumulative, done + MAXSAMPLES, side='right')), begin + 1)
+        span = numpy.repeat(numpy.arange(begin, end), counts[begin:end])
+        px = xstart[span] + numpy.arange(len(span)) - (cumulative[span] - counts[span] - done)
+        py = rows[span]
+        plane = planes[owner[span]]
+        q = plane[:, 0] * px + plane[:, 1] * py + plane[:, 2]
+        pixels = py * width + px
+        numpy.maximum.at(depthbuffer, pixels, q)
+        nearest = q >= depthbuffer[pixels]
+        facebuffer[pixels[nearest]] = faces[owner[span[nearest]]]
+        begin = end
+    return depthbuffer.reshape(height, width), facebuffer.reshape(height, width)
+
+
+def neighbourhoodmin(depthbuffer):
+    """Retorna o buffer com a menor profundidade da vizinhanca 3x3 de cada pixel. Perto do contorno de uma superficie
+    inclinada a profundidade varia muito de um pixel para o outro; comparando as arestas com o minimo da vizinhanca, so
+    sao ocultados os pixels inteiramente cercados por uma superficie mais proxima"""
+    padded = numpy.pad(depthbuffer, 1, mode='edge')
+    height, width = depthbuffer.shape
+    result = depthbuffer.copy()
+    for dy in range(3):
+        for dx in range(3):
+            numpy.minimum(result, padded[dy:dy + height, dx:dx + width], out=result)
+    return result
+
+
+def splitedges(xy, depth, edges, depthbuffer, facebuffer, edgefaces=None, epsilon=DEPTHEPSILON):
+    """Amostra as arestas pixel a pixel, como rasterizer.rasterizelines, e compara cada amostra com o buffer de
+    profundidade. Uma amostra eh visivel se a face mais proxima no pixel eh uma das faces da propria aresta (edgefaces,
+    ver TriDObject.edgefaces) ou se a sua profundidade nao eh menor que a menor profundidade do buffer na vizinhanca do
+    pixel (ver neighbourhoodmin), com tolerancia relativa epsilon. Pixels nao cobertos tem profundidade 0, e amostras
+    fora da tela ou atras do ponto de vista sao consideradas visiveis. Arestas com extremidades infinitas ou NaN
+    (vertices na profundidade do ponto de vista) sao descartadas.
+
+    Retorna uma tupla (visible, hidden) de matrizes (K, 4) com as coordenadas de tela (x0, y0, x1, y1) dos trechos
+    visiveis e ocultos das arestas, com as extremidades nos pixels amostrados"""
+    segments = numpy.trunc(numpy.hstack((xy[edges[:, 0]], xy[edges[:, 1]])))
+    finite = numpy.isfinite(segments).all(axis=1)
+    if not finite.all():
+        segments = segments[finite]
+        edges = edges[finite]
+        edgefaces = edgefaces[finite] if edgefaces is not None else None
+    if not len(segments):
+        return numpy.zeros((0, 4)), numpy.zeros((0, 4))
+    owner, t, points = rasterizer.linesamples(segments)
+    q = depth[edges[owner, 0]] + t * (depth[edges[owner, 1]] - depth[edges[owner, 0]])
+
+    height, width = depthbuffer.shape
+    inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+    pixels = (points[inside, 1] * width + points[inside, 0])
+    nearestface = facebuffer.reshape(-1)[pixels]
+    visible = numpy.ones(len(owner), dtype=bool)
+    covered = (q[inside] > 0) & (q[inside] < neighbourhoodmin(depthbuffer).reshape(-1)[pixels] * (1.0 - epsilon))
+    if edgefaces is not None:
+        covered &= (nearestface != edgefaces[owner[inside], 0]) & (nearestface != edgefaces[owner[inside], 1])
+    visible[inside] = ~covered
+
+    # Trechos: sequencias de amostras seguidas da mesma aresta com a mesma visibilidade
+    starts = numpy.flatnonzero(numpy.r_[True, (owner[1:] != owner[:-1]) | (visible[1:] != visible[:-1])])
+    ends = numpy.r_[starts[1:], len(owner)] - 1
+    pieces = numpy.hstack((points[starts], points[ends])).astype(float)
+    runvisible = visible[starts]
+    return pieces[runvisible], pieces[~runvisible]
+
+
+def hiddenlines(projector, pointofview, width=rasterizer.SCREEN_WIDTH, height=rasterizer.SCREEN_HEIGHT):
+    """Projeta o objeto carregado em projector (um projection.PerspectiveProjection) a partir de pointofview, com o
+    mesmo ajuste a tela de rasterizer.render, e remove as linhas ocultas pelo buffer de profundidade. Somente as faces
+    que passam pelo teste de faces ocultas sao rasterizadas, e somente as arestas entre os seus vertices sao testadas.
+
+    Retorna uma tupla (visible, hidden, depthbuffer, facebuffer): os trechos de aresta visiveis e ocultos (ver
+    splitedges) e os buffers de rasterizefaces"""
+    if not projector.tridiobject:
+        projector.loadtridiobject()
+    tridiobject = projector.tridiobject
+    camera = projector.camera
+    results = tridiobject.coords @ projector.projectionmatrix(pointofview).T
+    xy = results[:, :2] / results[:, 3:4]
+    # d: distancia do ponto de vista ao plano de projecao, na escala do vetor normal (ver camera.perspectivematrices)
+    d = numpy.subtract(camera.planepoint, pointofview) @ numpy.asarray(camera.planenormal)
+    depth = d / results[:, 3]
+
+    visiblefaces = ~ projector.hiddenfacesmask(pointofview)[0]
+    usedvertices = tridiobject.vertexmask(visiblefaces)[0]
+    if not usedvertices.any():
+        return numpy.zeros((0, 4)), numpy.zeros((0, 4)), numpy.zeros((height, width)), \
+            numpy.full((height, width), -1, dtype=numpy.intp)
+    lower, upper = finitebounds(xy[usedvertices])
+    xy = Viewport.fit(lower, upper, width, height).map(xy)
+
+    faceoffsets, faceindices = tridiobject.facearrays()
+    depthbuffer, facebuffer = rasterizefaces(xy, depth, faceoffsets, faceindices, width, height,
+                                             numpy.flatnonzero(visiblefaces))
+    edges = tridiobject.edgearray
+    testededges = usedvertices[edges[:, 0]] & usedvertices[edges[:, 1]]
+    visible, hidden = splitedges(xy, depth, edges[testededges], depthbuffer, facebuffer,
+                                 tridiobject.edgefaces()[testededges])
+    return visible, hidden, depthbuffer, facebuffer
+
+
+def render(projector, pointofview, width=rasterizer.SCREEN_WIDTH, height=rasterizer.SCREEN_HEIGHT,
+           background=rasterizer.BACKGROUND, color=rasterizer.FOREGROUND, hiddencolor=None):
+    """Como rasterizer.render, mas desenha somente os trechos visiveis das arestas. Se hiddencolor for passada, os
+    trechos ocultos sao desenhados nessa cor"""
+    visible, hidden = hiddenlines(projector, pointofview, width, height)[:2]
+    image = rasterizer.newimage(width, height, background)
+    if hiddencolor is not None:
+        rasterizer.rasterizelines(image, hidden, hiddencolor)
+    return rasterizer.rasterizelines(image, visible, color)
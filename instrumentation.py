@@ -0,0 +1,96 @@
+import json
+import marshal
+import time
+
+__author__ = 'https://github.com/rafaiska'
+
+# Instrumentacao opcional das etapas de PerspectiveProjection.getprojection e MainView.drawprojection. Cada etapa eh
+# delimitada por "with instrumentation.stage(nome, vertices=..., ...)". Quando a instrumentacao esta desligada (o
+# padrao, NOINSTRUMENTATION), stage retorna sempre o mesmo objeto, cujos __enter__ e __exit__ nao fazem nada.
+
+
+class NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        return False
+
+    def count(self, **counts):
+        pass
+
+
+NULLSTAGE = NullStage()
+
+
+class NullInstrumentation(object):
+    enabled = False
+
+    def stage(self, name, **counts):
+        return NULLSTAGE
+
+
+NOINSTRUMENTATION = NullInstrumentation()
+
+
+class Stage(object):
+    def __init__(self, instrumentation, name, counts):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.counts = counts
+        self.began = 0.0
+
+    def __enter__(self):
+        self.began = self.instrumentation.clock()
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.instrumentation.record(self.name, self.instrumentation.clock() - self.began, self.counts)
+        return False
+
+    def count(self, **counts):
+        """Registra contagens conhecidas somente durante a etapa (por exemplo, o numero de faces removidas)"""
+        self.counts.update(counts)
+
+
+class Instrumentation(object):
+    """Acumula, para cada etapa, o numero de chamadas, o tempo total de parede e a soma de cada contagem (vertices,
+    arestas, faces...). callback, se passada, eh chamada ao fim de cada etapa com (nome, segundos, contagens)"""
+    enabled = True
+
+    def __init__(self, callback=None, clock=time.perf_counter):
+        self.callback = callback
+        self.clock = clock
+        self.stages = {}
+
+    def stage(self, name, **counts):
+        return Stage(self, name, counts)
+
+    def record(self, name, seconds, counts):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {'calls': 0, 'seconds': 0.0, 'counts': {}}
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        for key, value in counts.items():
+            entry['counts'][key] = entry['counts'].get(key, 0) + value
+        if self.callback is not None:
+            self.callback(name, seconds, counts)
+
+    def reset(self):
+        self.stages = {}
+
+    def dumpjson(self, path):
+        """Grava as estatisticas acumuladas em json"""
+        with open(path, 'w') as statsfile:
+            json.dump(self.stages, statsfile, indent=2, sort_keys=True)
+
+    def dumpstats(self, path):
+        """Grava as estatisticas no formato do cProfile, que pode ser lido por pstats.Stats(path) e por visualizadores
+        de perfis. Cada etapa aparece como uma funcao de nome igual ao da etapa"""
+        stats = {}
+        for name, entry in self.stages.items():
+            calls = entry['calls']
+            stats[('<stage>', 0, name)] = (calls, calls, entry['seconds'], entry['seconds'], {})
+        with open(path, 'wb') as statsfile:
+            marshal.dump(stats, statsfile)
@@ -0,0 +1,181 @@
+import os
+import sys
+import numpy
+import meshfiles
+import projection
+
+__author__ = 'https://github.com/rafaiska'
+
+# Niveis de detalhe (LOD). Uma etapa offline simplifica a figura por colapso de arestas e grava a cadeia de niveis ao
+# lado do modelo (MODELO.lod1.tdo, MODELO.lod2.tdo, ...). Na hora de projetar, o nivel eh escolhido pelo tamanho da
+# caixa envolvente projetada, em pixels, de modo que o custo do desenho fique limitado pela resolucao da tela e nao pela
+# complexidade do modelo.
+
+# Cada nivel tem aproximadamente LODRATIO vezes os vertices do nivel anterior. A cadeia termina ao chegar em
+# LODMINVERTICES vertices
+LODRATIO = 0.5
+LODMINVERTICES = 64
+
+# Espacamento medio, em pixels, entre vertices vizinhos abaixo do qual detalhes a mais nao aparecem na tela
+LODSPACING = 4.0
+
+
+def collapseedges(coords, edges, faceoffsets, faceindices, ncollapses):
+    """Colapsa de uma so vez ate ncollapses arestas, escolhidas entre as mais curtas de modo que nenhum vertice
+    participe de dois colapsos: uma aresta eh escolhida se for a mais curta de seus dois vertices. Os dois vertices de
+    cada aresta escolhida sao unidos no de menor indice, posicionado no ponto medio. Retorna uma tupla (keep, coords,
+    edges, keepfaces, faceoffsets, faceindices), onde keep e keepfaces sao os indices dos vertices e faces mantidos"""
+    nvertices = coords.shape[0]
+    lengths = numpy.linalg.norm(coords[edges[:, 0], :3] - coords[edges[:, 1], :3], axis=1)
+    # A posicao de cada aresta na ordenacao por comprimento desempata arestas de mesmo comprimento
+    rank = numpy.empty(len(edges), dtype=numpy.intp)
+    rank[numpy.argsort(lengths, kind='stable')] = numpy.arange(len(edges))
+    best = numpy.full(nvertices, len(edges), dtype=numpy.intp)
+    numpy.minimum.at(best, edges[:, 0], rank)
+    numpy.minimum.at(best, edges[:, 1], rank)
+    selected = numpy.flatnonzero((rank == best[edges[:, 0]]) & (rank == best[edges[:, 1]]))
+    selected = selected[numpy.argsort(rank[selected])][:ncollapses]
+
+    a = numpy.minimum(edges[selected, 0], edges[selected, 1])
+    b = numpy.maximum(edges[selected, 0], edges[selected, 1])
+    coords = coords.copy()
+    coords[a] = (coords[a] + coords[b]) / 2.0
+    used = numpy.ones(nvertices, dtype=bool)
+    used[b] = False
+    merged = numpy.arange(nvertices)
+    merged[b] = a
+    remap = (numpy.cumsum(used) - 1)[merged]
+    keep = numpy.flatnonzero(used)
+
+    # Arestas: descarta as colapsadas e as repetidas
+    edges = remap[edges]
+    edges = numpy.sort(edges[edges[:, 0] != edges[:, 1]], axis=1)
+    edges = numpy.unique(edges, axis=0).reshape(-1, 2)
+
+    # Faces: descarta vertices repetidos em sequencia (inclusive o ultimo seguido do primeiro) e as faces que ficarem
+    # com menos de tres vertices
+    nfaces = len(faceoffsets) - 1
+    lengths = numpy.diff(faceoffsets)
+    owner = numpy.repeat(numpy.arange(nfaces), lengths)
+    flat = remap[faceindices]
+    previous = numpy.arange(len(flat)) - 1
+    nonempty = lengths > 0
+    previous[faceoffsets[:-1][nonempty]] = faceoffsets[1:][nonempty] - 1
+    entries = flat != flat[previous] if len(flat) else numpy.zeros(0, dtype=bool)
+    remaining = numpy.bincount(owner[entries], minlength=nfaces)
+    keepfaces = numpy.flatnonzero(remaining >= 3)
+    entries &= (remaining >= 3)[owner]
+    faceoffsets = numpy.zeros(len(keepfaces) + 1, dtype=numpy.intp)
+    numpy.cumsum(remaining[keepfaces], out=faceoffsets[1:])
+    return keep, coords[keep], edges, keepfaces, faceoffsets, flat[entries]
+
+
+def simplify(tridiobject, targetvertices):
+    """Retorna um novo TriDObject com aproximadamente targetvertices vertices, obtido por colapsos sucessivos das
+    arestas mais curtas de tridiobject. Os vertices e faces restantes mantem os seus nomes"""
+    coords = numpy.array(tridiobject.coords)
+    edges = tridiobject.edgearray
+    faceoffsets, faceindices = tridiobject.facearrays()
+    names = numpy.array(tridiobject.names, dtype=object)
+    facenames = numpy.array(list(tridiobject.faceindices.keys()), dtype=object)
+    while coords.shape[0] > targetvertices and len(edges):
+        keep, coords, edges, keepfaces, faceoffsets, faceindices = collapseedges(
+            coords, edges, faceoffsets, faceindices, coords.shape[0] - targetvertices)
+        if len(keep) == len(names):
+            break
+        names = names[keep]
+        facenames = facenames[keepfaces]
+
+    simplified = projection.TriDObject()
+    simplified.loadfromarrays(names.tolist(), coords, edges, facenames.tolist(), faceoffsets, faceindices)
+    return simplified
+
+
+def buildlevels(tridiobject, ratio=LODRATIO, minvertices=LODMINVERTICES):
+    """Gera a cadeia de niveis de detalhe, do modelo original (nivel 0) ao mais simples"""
+    levels = [tridiobject]
+    while levels[-1].nvertices * ratio >= minvertices:
+        simplified = simplify(levels[-1], int(levels[-1].nvertices * ratio))
+        if simplified.nvertices >= levels[-1].nvertices:
+            break
+        levels.append(simplified)
+    return levels
+
+
+def levelpath(objectpath, level):
+    return '%s.lod%d%s' % (os.path.splitext(objectpath)[0], level, meshfiles.BINEXTENSION)
+
+
+def savelevels(objectpath, levels):
+    """Grava os niveis simplificados (a partir do nivel 1) ao lado do modelo objectpath"""
+    for level, tridiobject in enumerate(levels[1:], 1):
+        tridiobject.savebinary(levelpath(objectpath, level))
+
+
+def loadlevels(objectpath):
+    """Carrega o modelo objectpath e os niveis gravados por savelevels, se existirem"""
+    levels = [projection.loadmodel(objectpath)]
+    while os.path.exists(levelpath(objectpath, len(levels))):
+        levels.append(projection.loadmodel(levelpath(objectpath, len(levels))))
+    return levels
+
+
+class LevelOfDetailProjection(object):
+    """Projeta, a partir de cada ponto de vista, o nivel de detalhe adequado ao tamanho da figura na tela. Tem a mesma
+    interface de PerspectiveProjection.getprojection e pode substitui-lo em animation.Animation e em view.
+
+    pixelsperunit eh a escala entre o plano de projecao e a tela. Se for None, a projecao eh ajustada a tela inteira
+    width x height (como em viewport.Viewport.fit) e o tamanho na tela eh sempre o da tela. O nivel escolhido eh o
+    mais detalhado cujo numero de vertices nao ultrapassa (tamanho / spacing) ** 2"""
+    def __init__(self, levels, pixelsperunit=None, width=800, height=600, spacing=LODSPACING):
+        self.levels = levels
+        self.projectors = []
+        for tridiobject in levels:
+            projector = projection.PerspectiveProjection()
+            projector.tridiobject = tridiobject
+            self.projectors.append(projector)
+        self.pixelsperunit = pixelsperunit
+        self.width = width
+        self.height = height
+        self.spacing = spacing
+        self.projection = None
+        self.level = 0
+
+    def screensize(self, pointofview):
+        """Tamanho, em pixels, do maior lado da caixa envolvente do modelo projetada a partir de pointofview"""
+        screen = float(min(self.width, self.height))
+        if self.pixelsperunit is None:
+            return screen
+        lower, upper = self.levels[0].bounds()
+        corners = numpy.array([(x, y, z, 1.0) for x in (lower[0], upper[0]) for y in (lower[1], upper[1])
+                               for z in (lower[2], upper[2])])
+        results = corners @ numpy.asarray(self.projectors[0].perspectivematrix(pointofview)).T
+        # Cantos atras do ponto de vista (w com sinal trocado) nao tem tamanho definido: usa a tela inteira
+        if (results[:, 3] * pointofview[2] >= 0).any():
+            return screen
+        xy = results[:, :2] / results[:, 3:4]
+        return min(screen, float(numpy.ptp(xy, axis=0).max()) * self.pixelsperunit)
+
+    def selectlevel(self, pointofview):
+        budget = (self.screensize(pointofview) / self.spacing) ** 2
+        for level, tridiobject in enumerate(self.levels):
+            if tridiobject.nvertices <= budget:
+                return level
+        return len(self.levels) - 1
+
+    def getprojection(self, pointofview):
+        self.level = self.selectlevel(pointofview)
+        self.projection = self.projectors[self.level].getprojection(pointofview)
+        return self.projection
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('Uso: python lod.py MODELO')
+        sys.exit(1)
+    generated = buildlevels(projection.loadmodel(sys.argv[1]))
+    savelevels(sys.argv[1], generated)
+    for index, generatedlevel in enumerate(generated):
+        print('nivel %d: %d vertices, %d arestas, %d faces' % (index, generatedlevel.nvertices,
+                                                               generatedlevel.nedges(),
+                                                               len(generatedlevel.faceindices)))
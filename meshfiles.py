@@ -0,0 +1,436 @@
+import json
+import struct
+import sys
+import numpy
+
+__author__ = 'https://github.com/rafaiska'
+
+# Formato binario de figuras 3D (extensao .tdo). O arquivo eh composto por:
+#
+# - 8 bytes com a assinatura BINMAGIC
+# - 8 bytes com o tamanho H do cabecalho, inteiro sem sinal little-endian
+# - H bytes de cabecalho em JSON (utf-8), com os nomes dos vertices e das faces e, para cada matriz, seu deslocamento
+#   no arquivo, tipo e formato
+# - as matrizes, cada uma alinhada em BINALIGNMENT bytes, gravadas de forma contigua:
+#     coords: (N, 4) float64, coordenadas homogeneas (X, Y, Z, 1) de cada vertice
+#     edges: (E, 2) int64, pares de indices de vertices, cada aresta aparecendo uma unica vez
+#     faceoffsets: (F + 1,) int64, a face i usa faceindices[faceoffsets[i]:faceoffsets[i + 1]]
+#     faceindices: (K,) int64, indices dos vertices de todas as faces, concatenados
+#     facenormals e faceplaneoffsets (opcionais): (F, 3) e (F,) float64, os planos das faces (ver
+#       projection.TriDObject.faceplanes), para que eles nao precisem ser recalculados por quem abre o arquivo
+#
+# Como as matrizes estao alinhadas e gravadas no formato nativo, elas podem ser abertas com numpy.memmap sem copia.
+
+BINMAGIC = b'TRIDOBJ1'
+BINEXTENSION = '.tdo'
+BINALIGNMENT = 64
+BINARRAYS = (('coords', '<f8'), ('edges', '<i8'), ('faceoffsets', '<i8'), ('faceindices', '<i8'))
+BINPLANEARRAYS = (('facenormals', '<f8'), ('faceplaneoffsets', '<f8'))
+
+
+def isbinary(path):
+    """Verifica, pela assinatura, se o arquivo esta no formato binario"""
+    with open(path, 'rb') as objfile:
+        return objfile.read(len(BINMAGIC)) == BINMAGIC
+
+
+def writebinary(path, names, coords, edges, facenames, faceoffsets, faceindices, planes=None):
+    """Grava uma figura 3D no formato binario descrito acima. planes, se passada, eh a tupla (normals, offsets) com os
+    planos das faces"""
+    arrays = {'coords': numpy.asarray(coords, dtype='<f8').reshape(-1, 4),
+              'edges': numpy.asarray(edges, dtype='<i8').reshape(-1, 2),
+              'faceoffsets': numpy.asarray(faceoffsets, dtype='<i8'),
+              'faceindices': numpy.asarray(faceindices, dtype='<i8')}
+    layout = BINARRAYS
+    if planes is not None:
+        arrays['facenormals'] = numpy.asarray(planes[0], dtype='<f8').reshape(-1, 3)
+        arrays['faceplaneoffsets'] = numpy.asarray(planes[1], dtype='<f8').reshape(-1)
+        layout = BINARRAYS + BINPLANEARRAYS
+
+    # O cabecalho precisa conhecer os deslocamentos das matrizes, que dependem do tamanho do proprio cabecalho. Ele eh
+    # montado primeiro com deslocamentos provisorios e depois preenchido com espaco reservado para os definitivos
+    header = {'names': list(names), 'facenames': list(facenames), 'arrays': {}}
+    for key, dtype in layout:
+        header['arrays'][key] = {'offset': 0, 'dtype': dtype, 'shape': list(arrays[key].shape)}
+    reserved = len(json.dumps(header).encode('utf-8')) + 32 * len(layout)
+
+    offset = len(BINMAGIC) + 8 + reserved
+    for key, dtype in layout:
+        offset += - offset % BINALIGNMENT
+        header['arrays'][key]['offset'] = offset
+        offset += arrays[key].nbytes
+    encoded = json.dumps(header).encode('utf-8').ljust(reserved)
+
+    with open(path, 'wb') as objfile:
+        objfile.write(BINMAGIC)
+        objfile.write(struct.pack('<Q', len(encoded)))
+        objfile.write(encoded)
+        for key, dtype in layout:
+            objfile.seek(header['arrays'][key]['offset'])
+            objfile.write(arrays[key].tobytes())
+
+
+def readbinary(path):
+    """Abre uma figura 3D gravada no formato binario. Retorna um dicionario com as listas names e facenames e as
+    matrizes coords, edges, faceoffsets e faceindices (e facenormals e faceplaneoffsets, se gravadas), abertas com
+    numpy.memmap (somente leitura, sem copia)"""
+    with open(path, 'rb') as objfile:
+        if objfile.read(len(BINMAGIC)) != BINMAGIC:
+            raise ValueError('Arquivo %s nao esta no formato binario de figuras 3D' % path)
+        length = struct.unpack('<Q', objfile.read(8))[0]
+        header = json.loads(objfile.read(length).decode('utf-8'))
+
+    loaded = {'names': header['names'], 'facenames': header['facenames']}
+    for key, description in header['arrays'].items():
+        shape = tuple(description['shape'])
+        if 0 in shape:
+            # numpy.memmap nao aceita mapear regioes vazias
+            loaded[key] = numpy.zeros(shape, dtype=description['dtype'])
+        else:
+            loaded[key] = numpy.memmap(path, dtype=description['dtype'], mode='r', offset=description['offset'],
+                                       shape=shape)
+    return loaded
+
+
+def convertjson(jsonpath, binarypath):
+    """Converte uma figura 3D descrita no esquema json de cubo.json e objeto.json (vertices, edges e faces) para o
+    formato binario. As arestas, listadas nos dois sentidos no json, sao gravadas uma unica vez"""
+    with open(jsonpath, 'r') as objfile:
+        loadedjson = json.load(objfile)
+
+    vertices = loadedjson['vertices']
+    names = list(vertices.keys())
+    nameindex = {name: i for i, name in enumerate(names)}
+    coords = numpy.ones((len(names), 4))
+    coords[:, :3] = numpy.array(list(vertices.values()), dtype=float).reshape(-1, 3)
+
+    edges = set()
+    for src, dsts in loadedjson['edges'].items():
+        srcindex = nameindex[src]
+        for dst in dsts:
+            dstindex = nameindex[dst]
+            edges.add((min(srcindex, dstindex), max(srcindex, dstindex)))
+    edges = numpy.array(sorted(edges), dtype=numpy.int64).reshape(-1, 2)
+
+    faces = loadedjson['faces']
+    faceindices = [nameindex[name] for verticeslist in faces.values() for name in verticeslist]
+    faceoffsets = numpy.cumsum([0] + [len(verticeslist) for verticeslist in faces.values()])
+
+    writebinary(binarypath, names, coords, edges, faces.keys(), faceoffsets, faceindices)
+
+
+# Quantidade de linhas (ou registros, nos arquivos binarios) lidas de cada vez pelos importadores de OBJ e PLY
+IMPORTCHUNK = 65536
+# Bytes lidos de cada vez nos elementos PLY binarios com listas
+PLYBLOCKBYTES = 1 << 20
+
+PLYTYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1', 'short': 'i2', 'int16': 'i2',
+            'ushort': 'u2', 'uint16': 'u2', 'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+            'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+
+class ArrayBuilder(object):
+    """Matriz numpy que cresce por blocos. Os importadores acumulam cada bloco lido do arquivo em uma lista pequena e
+    o despejam aqui, de modo que o pico de memoria fique proximo do tamanho final da matriz"""
+    def __init__(self, dtype, width=None):
+        self.shape = () if width is None else (width,)
+        self.buffer = numpy.zeros((0,) + self.shape, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = numpy.asarray(values, dtype=self.buffer.dtype).reshape((-1,) + self.shape)
+        needed = self.size + values.shape[0]
+        if needed > self.buffer.shape[0]:
+            # Cresce em 50% para limitar o espaco ocioso
+            self.buffer.resize((max(needed, self.buffer.shape[0] * 3 // 2, 1024),) + self.shape, refcheck=False)
+        self.buffer[self.size:needed] = values
+        self.size = needed
+
+    def result(self):
+        self.buffer.resize((self.size,) + self.shape, refcheck=False)
+        return self.buffer
+
+
+def edgesfromfaces(faceoffsets, faceindices):
+    """Deriva as arestas a partir das faces: cada par de vertices consecutivos de uma face (incluindo o ultimo e o
+    primeiro) forma uma aresta. Retorna uma matriz (E, 2) com cada aresta uma unica vez, o menor indice primeiro"""
+    faceoffsets = numpy.asarray(faceoffsets, dtype=numpy.int64)
+    faceindices = numpy.asarray(faceindices, dtype=numpy.int64)
+    if not len(faceindices):
+        return numpy.zeros((0, 2), dtype=numpy.int64)
+
+    # O proximo vertice de cada posicao eh o seguinte na lista, exceto no fim da face, que volta ao inicio dela
+    following = numpy.arange(1, len(faceindices) + 1)
+    sizes = numpy.diff(faceoffsets)
+    following[faceoffsets[1:][sizes > 0] - 1] = faceoffsets[:-1][sizes > 0]
+    pairs = numpy.stack((faceindices, faceindices[following]), axis=1)
+    pairs.sort(axis=1)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    return numpy.unique(pairs, axis=0)
+
+
+def readobj(objpath):
+    """Le um arquivo Wavefront OBJ linha a linha, preenchendo as matrizes de vertices e faces por blocos. Somente as
+    linhas 'v' e 'f' sao consideradas; indices negativos (relativos), vertices com cor (v x y z r g b) e os formatos
+    v/vt/vn de face sao aceitos. Retorna uma tupla (coords, faceoffsets, faceindices) com coords em coordenadas
+    homogeneas (N, 4)"""
+    coords = ArrayBuilder(float, 4)
+    faceindices = ArrayBuilder(numpy.int64)
+    facesizes = ArrayBuilder(numpy.int64)
+    pendingcoords, pendingindices, pendingsizes = [], [], []
+    nvertices = 0
+
+    def flush():
+        coords.extend(pendingcoords)
+        faceindices.extend(pendingindices)
+        facesizes.extend(pendingsizes)
+        del pendingcoords[:], pendingindices[:], pendingsizes[:]
+
+    with open(objpath, 'r') as objfile:
+        for line in objfile:
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == 'v':
+                x, y, z = float(fields[1]), float(fields[2]), float(fields[3])
+                # Um quarto numero eh a coordenada homogenea w; linhas com mais numeros trazem a cor do vertice (v x y z
+                # r g b), e os valores alem de x, y e z sao ignorados
+                w = float(fields[4]) if len(fields) == 5 else 1.0
+                pendingcoords.append((x / w, y / w, z / w, 1.0))
+                nvertices += 1
+            elif fields[0] == 'f':
+                for field in fields[1:]:
+                    index = int(field.split('/', 1)[0])
+                    pendingindices.append(index - 1 if index > 0 else nvertices + index)
+                pendingsizes.append(len(fields) - 1)
+            else:
+                continue
+            if len(pendingcoords) + len(pendingsizes) >= IMPORTCHUNK:
+                flush()
+    flush()
+
+    faceoffsets = numpy.zeros(facesizes.size + 1, dtype=numpy.int64)
+    numpy.cumsum(facesizes.result(), out=faceoffsets[1:])
+    return coords.result(), faceoffsets, faceindices.result()
+
+
+def readplyheader(plyfile):
+    """Le o cabecalho de um arquivo PLY. Retorna o formato e uma lista de elementos (nome, quantidade, propriedades),
+    onde cada propriedade eh uma tupla (nome, tipo) ou (nome, tipo da contagem, tipo dos itens) para listas"""
+    if plyfile.readline().strip() != b'ply':
+        raise ValueError('Arquivo nao esta no formato PLY')
+    plyformat = None
+    elements = []
+    while True:
+        line = plyfile.readline()
+        if not line:
+            raise ValueError('Cabecalho PLY incompleto')
+        fields = line.decode('ascii').split()
+        if not fields or fields[0] in ('comment', 'obj_info'):
+            continue
+        if fields[0] == 'end_header':
+            return plyformat, elements
+        if fields[0] == 'format':
+            plyformat = fields[1]
+        elif fields[0] == 'element':
+            elements.append((fields[1], int(fields[2]), []))
+        elif fields[0] == 'property' and fields[1] == 'list':
+            elements[-1][2].append((fields[4], PLYTYPES[fields[2]], PLYTYPES[fields[3]]))
+        elif fields[0] == 'property':
+            elements[-1][2].append((fields[2], PLYTYPES[fields[1]]))
+
+
+def readplyascii(plyfile, elements, coords, faceindices, facesizes):
+    for elementname, count, properties in elements:
+        pendingcoords, pendingindices, pendingsizes = [], [], []
+        for row in range(count):
+            fields = plyfile.readline().split()
+            position = 0
+            values = {}
+            for plyproperty in properties:
+                if len(plyproperty) == 3:
+                    size = int(fields[position])
+                    values[plyproperty[0]] = fields[position + 1:position + 1 + size]
+                    position += 1 + size
+                else:
+                    values[plyproperty[0]] = fields[position]
+                    position += 1
+            if elementname == 'vertex':
+                pendingcoords.append((float(values['x']), float(values['y']), float(values['z']), 1.0))
+            elif elementname == 'face':
+                indices = values.get('vertex_indices', values.get('vertex_index', []))
+                pendingindices.extend(int(index) for index in indices)
+                pendingsizes.append(len(indices))
+            if len(pendingcoords) + len(pendingsizes) >= IMPORTCHUNK:
+                coords.extend(pendingcoords)
+                faceindices.extend(pendingindices)
+                facesizes.extend(pendingsizes)
+                pendingcoords, pendingindices, pendingsizes = [], [], []
+        coords.extend(pendingcoords)
+        faceindices.extend(pendingindices)
+        facesizes.extend(pendingsizes)
+
+
+def plyrecordlayout(properties, byteorder):
+    """Layout dos registros de um elemento PLY binario: uma lista de tuplas (nome, tipo da contagem, tipo dos itens),
+    com tipo da contagem None para as propriedades que nao sao listas"""
+    return [(plyproperty[0], numpy.dtype(byteorder + plyproperty[1]), numpy.dtype(byteorder + plyproperty[2]))
+            if len(plyproperty) == 3 else (plyproperty[0], None, numpy.dtype(byteorder + plyproperty[1]))
+            for plyproperty in properties]
+
+
+def uniformplyprefix(data, layout, sizes, limit):
+    """Quantidade de registros no inicio de data, ate limit, cujas listas tem os tamanhos sizes (os do primeiro
+    registro), verificada de uma vez com uma matriz estruturada. Retorna uma tupla (records, itemsize, listoffsets),
+    com o tamanho dos registros em bytes e a posicao do primeiro item de cada lista dentro do registro"""
+    fields = []
+    for name, counttype, itemtype in layout:
+        if counttype is None:
+            fields.append((name, itemtype))
+        else:
+            fields.append((name + 'count', counttype))
+            fields.append((name, itemtype, (sizes[name],)))
+    dtype = numpy.dtype(fields)
+    records = numpy.frombuffer(data, dtype=dtype, count=min(limit, len(data) // dtype.itemsize))
+    uniform = numpy.ones(len(records), dtype=bool)
+    for name in sizes:
+        uniform &= records[name + 'count'] == sizes[name]
+    accepted = len(records) if uniform.all() else int(numpy.argmin(uniform))
+    return accepted, dtype.itemsize, {name: dtype.fields[name][1] for name in sizes}
+
+
+def walkplyrecords(data, layout, limit):
+    """Percorre os registros completos de tamanho variavel no inicio de data (bytes), ate limit registros. Os registros
+    iniciais com listas do mesmo tamanho das do primeiro (o caso comum de malhas so de triangulos ou so de
+    quadrilateros) sao verificados de uma vez (ver uniformplyprefix); a partir do primeiro que muda de tamanho, somente
+    as contagens das listas sao lidas, registro a registro. Retorna uma tupla (records, consumed, lists): o numero de
+    registros completos, o numero de bytes que eles ocupam e, para cada propriedade de lista, uma tupla (starts,
+    counts) de matrizes com a posicao em data do primeiro item e o numero de itens da lista em cada registro"""
+    starts = {name: [] for name, counttype, itemtype in layout if counttype is not None}
+    counts = {name: [] for name in starts}
+    prefix = {name: (numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)) for name in starts}
+    prefixrecords = 0
+    end = len(data)
+    position = 0
+    records = 0
+    while records < limit:
+        cursor = position
+        for name, counttype, itemtype in layout:
+            if counttype is None:
+                cursor += itemtype.itemsize
+                continue
+            if cursor + counttype.itemsize > end:
+                cursor = end + 1
+                break
+            if counttype.itemsize == 1:
+                count = data[cursor] if counttype.kind == 'u' else int(numpy.int8(data[cursor]))
+            else:
+                count = int.from_bytes(data[cursor:cursor + counttype.itemsize],
+                                       'big' if counttype.byteorder == '>' else 'little', signed=counttype.kind == 'i')
+            cursor += counttype.itemsize
+            starts[name].append(cursor)
+            counts[name].append(count)
+            cursor += count * itemtype.itemsize
+        if cursor > end:
+            # Registro incompleto: as listas ja anotadas dele sao descartadas
+            for name in starts:
+                del starts[name][records - prefixrecords:], counts[name][records - prefixrecords:]
+            break
+        if not records:
+            accepted, itemsize, listoffsets = uniformplyprefix(data, layout, {name: counts[name][0] for name in counts},
+                                                               limit)
+            if accepted > 1:
+                base = numpy.arange(accepted, dtype=numpy.int64) * itemsize
+                prefix = {name: (base + listoffsets[name], numpy.full(accepted, counts[name][0], dtype=numpy.int64))
+                          for name in starts}
+                starts = {name: [] for name in starts}
+                counts = {name: [] for name in starts}
+                position = accepted * itemsize
+                records = prefixrecords = accepted
+                continue
+        position = cursor
+        records += 1
+    lists = {name: (numpy.concatenate((prefix[name][0], numpy.array(starts[name], dtype=numpy.int64))),
+                    numpy.concatenate((prefix[name][1], numpy.array(counts[name], dtype=numpy.int64))))
+             for name in starts}
+    return records, position, lists
+
+
+def gatherplylist(data, starts, counts, itemtype):
+    """Reune em uma unica matriz os itens das listas em data, descritas por starts e counts (ver walkplyrecords)"""
+    lengths = counts * itemtype.itemsize
+    total = int(lengths.sum())
+    positions = numpy.repeat(starts - (numpy.cumsum(lengths) - lengths), lengths) + numpy.arange(total)
+    return numpy.frombuffer(data, dtype=numpy.uint8)[positions].view(itemtype)
+
+
+def readplybinary(plyfile, elements, byteorder, coords, faceindices, facesizes):
+    for elementname, count, properties in elements:
+        if not any(len(plyproperty) == 3 for plyproperty in properties):
+            # Registros de tamanho fixo: lidos por blocos diretamente como matriz estruturada
+            dtype = numpy.dtype([(name, byteorder + plytype) for name, plytype in properties])
+            remaining = count
+            while remaining:
+                size = min(remaining, IMPORTCHUNK)
+                records = numpy.frombuffer(plyfile.read(size * dtype.itemsize), dtype=dtype)
+                if elementname == 'vertex':
+                    block = numpy.ones((size, 4))
+                    block[:, 0] = records['x']
+                    block[:, 1] = records['y']
+                    block[:, 2] = records['z']
+                    coords.extend(block)
+                remaining -= size
+            continue
+
+        # Registros com listas: le-se um bloco de bytes por vez e percorrem-se as contagens das listas para localizar
+        # os registros, cujos itens sao entao reunidos de uma so vez. O registro incompleto do fim do bloco fica para o
+        # bloco seguinte
+        layout = plyrecordlayout(properties, byteorder)
+        names = [name for name, counttype, itemtype in layout]
+        key = 'vertex_indices' if 'vertex_indices' in names else 'vertex_index'
+        remaining = count
+        pending = b''
+        while remaining:
+            block = plyfile.read(PLYBLOCKBYTES)
+            data = pending + block
+            records, consumed, lists = walkplyrecords(data, layout, remaining)
+            if not records and not block:
+                raise ValueError('Arquivo PLY incompleto: faltam %d registros de %s' % (remaining, elementname))
+            if elementname == 'face' and key in lists:
+                starts, counts = lists[key]
+                faceindices.extend(gatherplylist(data, starts, counts, layout[names.index(key)][2]))
+                facesizes.extend(counts)
+            pending = data[consumed:]
+            remaining -= records
+        # Os bytes lidos alem do ultimo registro pertencem ao proximo elemento
+        plyfile.seek(- len(pending), 1)
+
+
+def readply(plypath):
+    """Le um arquivo PLY (ascii ou binario) por blocos, preenchendo as matrizes de vertices e faces de forma
+    incremental. Dos vertices sao usadas as propriedades x, y e z; das faces, a lista vertex_indices (ou vertex_index).
+    Retorna uma tupla (coords, faceoffsets, faceindices) com coords em coordenadas homogeneas (N, 4)"""
+    coords = ArrayBuilder(float, 4)
+    faceindices = ArrayBuilder(numpy.int64)
+    facesizes = ArrayBuilder(numpy.int64)
+
+    with open(plypath, 'rb') as plyfile:
+        plyformat, elements = readplyheader(plyfile)
+        if plyformat == 'ascii':
+            readplyascii(plyfile, elements, coords, faceindices, facesizes)
+        elif plyformat in ('binary_little_endian', 'binary_big_endian'):
+            byteorder = '<' if plyformat == 'binary_little_endian' else '>'
+            readplybinary(plyfile, elements, byteorder, coords, faceindices, facesizes)
+        else:
+            raise ValueError('Formato PLY desconhecido: %s' % plyformat)
+
+    faceoffsets = numpy.zeros(facesizes.size + 1, dtype=numpy.int64)
+    numpy.cumsum(facesizes.result(), out=faceoffsets[1:])
+    return coords.result(), faceoffsets, faceindices.result()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Uso: python meshfiles.py ENTRADA.json SAIDA%s' % BINEXTENSION)
+        sys.exit(1)
+    convertjson(sys.argv[1], sys.argv[2])
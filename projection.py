@@ -1,31 +1,410 @@
 import numpy
 import json
-from tkinter import *
+import collections
+import collections.abc
+import itertools
+import threading
+import meshfiles
+import spatialindex
+from viewport import finitebounds
+from camera import Camera, perspectivematrices
+from instrumentation import NOINSTRUMENTATION
 
 __author__ = 'https://github.com/rafaiska'
 
 OBJJSONPATH = 'objeto.json'
 
+# Pontos de vista sao arredondados para multiplos deste valor antes de serem usados como chave do cache de projecoes
+VIEWPOINTQUANTUM = 1e-3
+
+# Versoes de modelo, unicas entre todos os PerspectiveProjection, para que projetores com modelos diferentes possam
+# compartilhar um ProjectionCache
+MODELVERSIONS = itertools.count(1)
+
+
+def isaxisaligned(matrix):
+    """Verifica se a matriz 4x4 passada por parametro apenas escala, espelha e translada os eixos, ou seja, se eh afim
+    e sua parte linear eh diagonal"""
+    linear = matrix[:3, :3]
+    return (not numpy.any(linear - numpy.diag(numpy.diagonal(linear)))
+            and matrix[3, 0] == 0 and matrix[3, 1] == 0 and matrix[3, 2] == 0 and matrix[3, 3] == 1)
+
+
+def isaffine(matrix):
+    """Verifica se a matriz 4x4 passada por parametro eh afim (ultima linha 0, 0, 0, 1) e inversivel"""
+    return (matrix[3, 0] == 0 and matrix[3, 1] == 0 and matrix[3, 2] == 0 and matrix[3, 3] == 1
+            and numpy.linalg.det(matrix[:3, :3]) != 0)
+
+
+class FaceIndices(collections.abc.Mapping):
+    """Dicionario somente de leitura NOME_DA_FACE -> lista de indices dos vertices da face, lido diretamente das
+    matrizes do formato compacto (faceoffsets e faceindices, ver meshfiles), que podem ser abertas com memmap. Nenhuma
+    lista eh criada por face: as listas sao montadas somente quando uma face eh consultada. Eh o self.faceindices dos
+    objetos cujas faces sao definidas de uma vez (ver TriDObject.setfaces); addface o converte em dict"""
+    def __init__(self, facenames, faceoffsets, faceindices):
+        self.facenames = list(facenames)
+        self.faceoffsets = faceoffsets
+        self.faceindices = faceindices
+        self.positioncache = None
+
+    def __getitem__(self, facename):
+        if self.positioncache is None:
+            self.positioncache = {name: i for i, name in enumerate(self.facenames)}
+        i = self.positioncache[facename]
+        return self.faceindices[self.faceoffsets[i]:self.faceoffsets[i + 1]].tolist()
+
+    def __iter__(self):
+        return iter(self.facenames)
+
+    def __len__(self):
+        return len(self.facenames)
+
+    def values(self):
+        offsets = self.faceoffsets.tolist()
+        return (self.faceindices[offsets[i]:offsets[i + 1]].tolist() for i in range(len(self.facenames)))
+
+    def items(self):
+        return zip(self.facenames, self.values())
+
+
 class TriDObject(object):
     """Essa classe serve para representar uma figura espacial atraves de vertices e arestas, os quais estao em um
-    espaco de coordenadas do mundo (WCS). Os vertices e as arestas sao representadas da seguinte forma:
+    espaco de coordenadas do mundo (WCS). Internamente a figura eh guardada de forma compacta, indexada por inteiros:
+
+    self.coords: uma matriz numpy (N, 4) de ponto flutuante, contigua, onde a linha i contem as coordenadas homogeneas
+    (X, Y, Z, 1) do vertice de indice i
+
+    self.names: uma lista com o nome de cada vertice, na mesma ordem das linhas de self.coords
+
+    self.nameindex: um dicionario NOME_DO_VERTICE -> indice inteiro do vertice em self.coords
+
+    self.edgearray: uma matriz numpy (E, 2) de inteiros com os indices dos dois vertices de cada aresta. Cada aresta
+    aparece uma unica vez, com o menor indice primeiro. As vizinhancas de cada vertice podem ser consultadas em forma
+    CSR (ver adjacencycsr e neighbours)
+
+    self.faceindices: um dicionario NOME_DA_FACE -> lista de indices dos vertices da face (um FaceIndices, quando as
+    faces sao lidas das matrizes do formato compacto). Para cada vertice eh mantida
+    a contagem de referencias das faces que o usam (ver facerefcounts), o que permite remover varias faces de uma vez
+    (removefaces) descobrindo os vertices orfaos sem percorrer as faces restantes
+
+    self.sharedtopology: verdadeiro quando names, nameindex, as arestas e as faces sao compartilhadas com outro objeto
+    (ver transformed e loadfromnumpymatrix). A topologia compartilhada nunca eh alterada no lugar: as remocoes
+    (removefaces, keepfaces e updatevertices) montam novas estruturas, e as insercoes (addvertix, addedge e addface)
+    copiam as estruturas antes de altera-las (ver unsharetopology). Assim um modelo carregado pode ser projetado
+    repetidamente, inclusive em paralelo, sem copias
+
+    Os planos das faces (ver faceplanes) sao calculados uma vez e acompanham as transformacoes afins do objeto
+
+    self.transform: matriz 4x4 composta das transformacoes ainda nao aplicadas aos vertices, ou None. As operacoes
+    translation, scale e xzmirror apenas registram suas matrizes; os vertices sao multiplicados uma unica vez, pela
+    matriz composta, quando as coordenadas sao efetivamente lidas
+
+    As propriedades vertices, edges e faces continuam disponiveis no formato antigo, como visoes finas sobre a
+    representacao acima:
 
     self.vertices: uma lista contendo tuplas (NOME_DO_VERTICE, X, Y, Z), onde NOME_DO_VERTICE eh uma string, X, Y e Z
     sao coordenadas espaciais em ponto flutuante
 
-    self.edges: um dicionario cujas chaves sao vertices da figura, construidos como no formato acima. Cada chave
-    referencia uma lista de vertices, os quais formam adjacencia com o vertice chave. Na pratica, no contexto de
-    estrutura de dados, esse dicionario eh uma matriz de adjacencia de um grafo."""
+    self.edges: um dicionario cujas chaves sao nomes de vertices da figura. Cada chave referencia uma lista de nomes
+    de vertices, os quais formam adjacencia com o vertice chave"""
     def __init__(self):
-        self.vertices = []
-        self.edges = {}
-        self.faces = {}
+        self.coordsbuffer = numpy.zeros((0, 4))
+        self.nvertices = 0
+        self.names = []
+        self.nameindex = {}
+        self.edgesbuffer = numpy.zeros((0, 2), dtype=numpy.intp)
+        self.edgecount = 0
+        self.edgeset = None
+        self.csrcache = None
+        self.faceindices = {}
+        self.transform = None
+        self.basebounds = None
+        self.cornerscache = None
+        self.facearrayscache = None
+        self.refcountcache = None
+        self.edgefacescache = None
+        self.planecache = None
+        self.sharedtopology = False
+
+    @property
+    def edgearray(self):
+        return self.edgesbuffer[:self.edgecount]
+
+    def setedges(self, edges):
+        """Substitui todas as arestas de uma vez. edges eh uma matriz (E, 2) com cada aresta uma unica vez, o menor
+        indice primeiro"""
+        self.edgesbuffer = numpy.asarray(edges, dtype=numpy.intp).reshape(-1, 2)
+        self.edgecount = self.edgesbuffer.shape[0]
+        self.edgeset = None
+        self.csrcache = None
+
+    def adjacencycsr(self):
+        """Retorna a adjacencia dos vertices em formato CSR, como uma tupla (offsets, neighbours): os vizinhos do
+        vertice i sao neighbours[offsets[i]:offsets[i + 1]]. O resultado eh guardado ate que as arestas mudem"""
+        edges = self.edgearray
+        if self.csrcache is not None and self.csrcache[0] is self.edgesbuffer and \
+                self.csrcache[1] == (self.edgecount, self.nvertices):
+            return self.csrcache[2]
+        pairs = numpy.concatenate((edges, edges[:, ::-1]))
+        order = numpy.argsort(pairs[:, 0], kind='stable')
+        offsets = numpy.zeros(self.nvertices + 1, dtype=numpy.intp)
+        numpy.cumsum(numpy.bincount(pairs[:, 0], minlength=self.nvertices), out=offsets[1:])
+        csr = (offsets, pairs[order, 1])
+        self.csrcache = (self.edgesbuffer, (self.edgecount, self.nvertices), csr)
+        return csr
+
+    def neighbours(self, index):
+        """Retorna os indices dos vertices adjacentes ao vertice de indice index"""
+        offsets, neighbours = self.adjacencycsr()
+        return neighbours[offsets[index]:offsets[index + 1]]
+
+    @property
+    def coords(self):
+        if self.transform is not None:
+            self.applytransform()
+        return self.coordsbuffer[:self.nvertices]
+
+    def applytransform(self):
+        """Aplica aos vertices, em uma unica multiplicacao, a matriz composta das transformacoes pendentes"""
+        results = self.coordsbuffer[:self.nvertices] @ self.transform.T
+        # Divide-se pela coordenada w (coordenadas homogeneas) para obter as coordenadas reais de x, y e z
+        results /= results[:, 3:4]
+        self.coordsbuffer = results
+        self.transform = None
+        self.basebounds = None
+
+    def sharedcopy(self):
+        """Retorna um novo TriDObject igual a este, que compartilha com ele os vertices, as transformacoes pendentes e a
+        topologia (ver sharedtopology), sem copias. Alteracoes em um dos dois nao aparecem no outro"""
+        newtridiobject = TriDObject()
+        newtridiobject.coordsbuffer = self.coordsbuffer[:self.nvertices]
+        newtridiobject.nvertices = self.nvertices
+        newtridiobject.transform = self.transform
+        newtridiobject.basebounds = self.basebounds
+        newtridiobject.names = self.names
+        newtridiobject.nameindex = self.nameindex
+        newtridiobject.edgesbuffer = self.edgearray
+        newtridiobject.edgecount = self.edgecount
+        newtridiobject.csrcache = self.csrcache
+        newtridiobject.faceindices = self.faceindices
+        newtridiobject.cornerscache = self.cornerscache
+        newtridiobject.facearrayscache = self.facearrayscache
+        newtridiobject.refcountcache = self.refcountcache
+        newtridiobject.edgefacescache = self.edgefacescache
+        newtridiobject.planecache = self.planecache
+        self.sharedtopology = True
+        newtridiobject.sharedtopology = True
+        return newtridiobject
+
+    def transformed(self, matrix):
+        """Retorna um novo TriDObject que representa este objeto apos a transformacao descrita pela matriz 4x4 passada
+        por parametro. Os vertices e a topologia sao compartilhados com este objeto; a matriz eh apenas composta com as
+        transformacoes pendentes e so eh aplicada quando as coordenadas do novo objeto forem lidas"""
+        matrix = numpy.asarray(matrix, dtype=float)
+        newtridiobject = self.sharedcopy()
+        newtridiobject.transform = matrix if self.transform is None else matrix @ self.transform
+        newtridiobject.planecache = self.transformedplanes(matrix)
+        return newtridiobject
+
+    def transformedplanes(self, matrix):
+        """Leva os planos das faces guardados por faceplanes, se houver, pela transformacao afim matrix, sem
+        recalcula-los a partir dos vertices. As normais sao multiplicadas pelos cofatores da parte linear A (det(A)
+        vezes a inversa transposta), o que equivale a refazer o produto vetorial dos lados transformados, inclusive a
+        inversao das normais nas reflexoes. Retorna o novo conteudo de planecache, ou None se a matriz nao for afim"""
+        planes = self.currentplanes()
+        if planes is None or not isaffine(matrix):
+            return None
+        normals, offsets = planes
+        linear = matrix[:3, :3]
+        determinant = numpy.linalg.det(linear)
+        cofactors = determinant * numpy.linalg.inv(linear).T
+        # normal' . (A v + t) = det(A) normal . v + normal' . t
+        newnormals = normals @ cofactors.T
+        return self.faceindices, (newnormals, determinant * offsets + newnormals @ matrix[:3, 3])
+
+    def bounds(self):
+        """Retorna uma tupla (minimos, maximos) com os menores e maiores valores de x, y e z dos vertices finitos (ver
+        viewport.finitebounds). Se a transformacao pendente apenas escala, espelha e translada os eixos, a caixa eh
+        obtida transformando a caixa dos vertices base, sem aplicar a transformacao a todos os vertices"""
+        if self.transform is not None and not isaxisaligned(self.transform):
+            self.applytransform()
+        if self.basebounds is None:
+            self.basebounds = finitebounds(self.coordsbuffer[:self.nvertices, :3])
+        if self.transform is None:
+            return self.basebounds
+
+        rates = numpy.diagonal(self.transform)[:3]
+        offsets = self.transform[:3, 3]
+        lower = self.basebounds[0] * rates + offsets
+        upper = self.basebounds[1] * rates + offsets
+        return numpy.minimum(lower, upper), numpy.maximum(lower, upper)
+
+    @property
+    def vertices(self):
+        xyz = self.coords[:, :3].tolist()
+        return [(name, x, y, z) for name, (x, y, z) in zip(self.names, xyz)]
+
+    @property
+    def edges(self):
+        names = self.names
+        edges = {}
+        for src, dst in self.edgearray.tolist():
+            edges.setdefault(names[src], []).append(names[dst])
+            edges.setdefault(names[dst], []).append(names[src])
+        return edges
+
+    @property
+    def faces(self):
+        names = self.names
+        return {facename: [names[i] for i in indices] for facename, indices in self.faceindices.items()}
+
+    def facecorners(self):
+        """Retorna uma matriz (F, 3) de inteiros com os indices dos tres primeiros vertices de cada face, na ordem de
+        self.faceindices. Faces com mais de tres vertices (como f3 e f6 de objeto.json) usam apenas os tres primeiros;
+        faces degeneradas, com menos de tres, repetem o ultimo vertice. A matriz eh guardada ate que as faces mudem"""
+        if self.cornerscache is not None and self.cornerscache[0] is self.faceindices:
+            return self.cornerscache[1]
+        faceoffsets, faceindices = self.facearrays()
+        lengths = numpy.diff(faceoffsets)
+        positions = numpy.minimum(numpy.arange(3), numpy.maximum(lengths - 1, 0)[:, None])
+        corners = faceindices[faceoffsets[:-1, None] + positions] if len(faceindices) else \
+            numpy.zeros((len(lengths), 3), dtype=numpy.intp)
+        self.cornerscache = (self.faceindices, corners)
+        return corners
+
+    def facearrays(self):
+        """Retorna as faces no formato compacto de meshfiles, como uma tupla (faceoffsets, faceindices): os indices
+        dos vertices da face i (na ordem de self.faceindices) sao faceindices[faceoffsets[i]:faceoffsets[i + 1]]. As
+        matrizes sao guardadas ate que as faces mudem"""
+        if self.facearrayscache is not None and self.facearrayscache[0] is self.faceindices:
+            return self.facearrayscache[1]
+        faceoffsets = numpy.zeros(len(self.faceindices) + 1, dtype=numpy.intp)
+        numpy.cumsum([len(indices) for indices in self.faceindices.values()], out=faceoffsets[1:])
+        faceindices = numpy.fromiter((i for indices in self.faceindices.values() for i in indices),
+                                     dtype=numpy.intp, count=faceoffsets[-1])
+        self.facearrayscache = (self.faceindices, (faceoffsets, faceindices))
+        return faceoffsets, faceindices
+
+    def facerefcounts(self):
+        """Retorna a matriz (N,) com o numero de referencias a cada vertice nas faces: quantas vezes o vertice aparece
+        nas listas de self.faceindices. Vertices com contagem zero nao pertencem a nenhuma face"""
+        if self.refcountcache is not None and self.refcountcache[0] is self.faceindices and \
+                len(self.refcountcache[1]) == self.nvertices:
+            return self.refcountcache[1]
+        counts = numpy.bincount(self.facearrays()[1], minlength=self.nvertices)
+        self.refcountcache = (self.faceindices, counts)
+        return counts
+
+    def setfaces(self, facenames, faceoffsets, faceindices, refcounts=None):
+        """Substitui todas as faces de uma vez, a partir do formato compacto de meshfiles. refcounts, se conhecida, eh a
+        contagem de referencias correspondente (ver facerefcounts)"""
+        faceoffsets = numpy.asarray(faceoffsets, dtype=numpy.intp)
+        faceindices = numpy.asarray(faceindices, dtype=numpy.intp)
+        self.faceindices = FaceIndices(facenames, faceoffsets, faceindices)
+        self.cornerscache = None
+        self.facearrayscache = (self.faceindices, (faceoffsets, faceindices))
+        self.refcountcache = None if refcounts is None else (self.faceindices, refcounts)
+
+    def facenormals(self, faces=None):
+        """Calcula de uma so vez os vetores normais de todas as faces, a partir dos tres primeiros vertices de cada uma.
+        Retorna uma tupla (normals, anchors) de matrizes (F, 3): o vetor normal de cada face e o seu primeiro vertice.
+        faces, se passada, seleciona (por indices ou mascara booleana) as faces calculadas"""
+        corners = self.facecorners()
+        if faces is not None:
+            corners = corners[faces]
+        xyz = self.coords[:, :3]
+        v1 = xyz[corners[:, 0]]
+        v2 = xyz[corners[:, 1]]
+        v3 = xyz[corners[:, 2]]
+        return numpy.cross(v3 - v2, v1 - v2), v1
+
+    def edgefaces(self):
+        """Retorna a matriz (E, 2) de inteiros com os indices (na ordem de self.faceindices) das duas faces que contem
+        cada aresta de self.edgearray como lado, ou -1 onde nao houver face. Arestas compartilhadas por mais de duas
+        faces guardam apenas as duas primeiras. A matriz eh guardada ate que as arestas ou as faces mudem"""
+        if self.edgefacescache is not None and self.edgefacescache[0] is self.faceindices and \
+                self.edgefacescache[1] is self.edgesbuffer and len(self.edgefacescache[2]) == self.edgecount:
+            return self.edgefacescache[2]
+        edges = self.edgearray
+        faceoffsets, flat = self.facearrays()
+        adjacent = numpy.full((len(edges), 2), -1, dtype=numpy.intp)
+        if len(flat) and len(edges):
+            # Lados das faces: cada vertice ligado ao seguinte, e o ultimo ao primeiro
+            lengths = numpy.diff(faceoffsets)
+            owner = numpy.repeat(numpy.arange(len(lengths)), lengths)
+            following = numpy.arange(1, len(flat) + 1)
+            nonempty = lengths > 0
+            following[faceoffsets[1:][nonempty] - 1] = faceoffsets[:-1][nonempty]
+            sides = numpy.sort(numpy.stack((flat, flat[following]), axis=1), axis=1)
+
+            # Localiza cada lado entre as arestas pela chave menor * N + maior
+            edgekeys = edges[:, 0] * self.nvertices + edges[:, 1]
+            order = numpy.argsort(edgekeys, kind='stable')
+            sidekeys = sides[:, 0] * self.nvertices + sides[:, 1]
+            position = numpy.minimum(numpy.searchsorted(edgekeys[order], sidekeys), len(edges) - 1)
+            found = edgekeys[order][position] == sidekeys
+            edgeids = order[position[found]]
+            owner = owner[found]
+
+            # Primeira e segunda face de cada aresta
+            grouping = numpy.argsort(edgeids, kind='stable')
+            edgeids = edgeids[grouping]
+            owner = owner[grouping]
+            first = numpy.r_[True, edgeids[1:] != edgeids[:-1]]
+            second = numpy.r_[False, ~first[1:] & first[:-1]]
+            adjacent[edgeids[first], 0] = owner[first]
+            adjacent[edgeids[second], 1] = owner[second]
+        self.edgefacescache = (self.faceindices, self.edgesbuffer, adjacent)
+        return adjacent
+
+    def faceplanes(self):
+        """Retorna uma tupla (normals, offsets) com os vetores normais (F, 3) das faces, como em facenormals, e os
+        deslocamentos (F,) dos seus planos, normal . v1. Um ponto p esta atras da face se normal . p - offset < 0. Os
+        planos sao calculados uma unica vez (loadmodel os calcula ao carregar o modelo) e guardados ate que as faces
+        ou os vertices mudem; as transformacoes afins os atualizam sem recalcula-los (ver transformedplanes)"""
+        planes = self.currentplanes()
+        if planes is not None:
+            return planes
+        normals, anchors = self.facenormals()
+        planes = (normals, numpy.einsum('fi,fi->f', normals, anchors))
+        self.planecache = (self.faceindices, planes)
+        return planes
+
+    def vertexmask(self, visiblefaces):
+        """Recebe uma matriz booleana (M, F) de faces visiveis, na ordem de self.faceindices, e retorna a matriz
+        booleana (M, N) dos vertices que pertencem a alguma face visivel"""
+        visiblefaces = numpy.asarray(visiblefaces, dtype=bool).reshape(-1, len(self.faceindices))
+        visiblevertices = numpy.zeros((visiblefaces.shape[0], self.nvertices), dtype=bool)
+        faceoffsets, flat = self.facearrays()
+        if len(flat):
+            # Agrupa as ocorrencias de cada vertice nas faces e faz um "ou" logico das faces visiveis de cada grupo
+            owner = numpy.repeat(numpy.arange(len(faceoffsets) - 1), numpy.diff(faceoffsets))
+            order = numpy.argsort(flat, kind='stable')
+            flat = flat[order]
+            starts = numpy.flatnonzero(numpy.r_[True, flat[1:] != flat[:-1]])
+            visiblevertices[:, flat[starts]] = numpy.logical_or.reduceat(visiblefaces[:, owner[order]], starts, axis=1)
+        return visiblevertices
 
     def get_vertix(self, name):
-        for vertix in self.vertices:
-            if vertix[0] == name:
-                return vertix
-        return None
+        index = self.nameindex.get(name)
+        if index is None:
+            return None
+        x, y, z = self.coords[index, :3].tolist()
+        return name, x, y, z
+
+    def setcoords(self, names, coords):
+        """Substitui todos os vertices de uma vez. coords eh uma matriz (N, 3) ou (N, 4); se tiver 4 colunas ela deve
+        estar em coordenadas homogeneas ja normalizadas (w=1)"""
+        coords = numpy.asarray(coords, dtype=float)
+        if coords.shape[1] == 3:
+            coords = numpy.hstack((coords, numpy.ones((coords.shape[0], 1))))
+        self.coordsbuffer = numpy.ascontiguousarray(coords)
+        self.nvertices = coords.shape[0]
+        self.transform = None
+        self.basebounds = None
+        self.planecache = None
+        self.names = list(names)
+        self.nameindex = {name: i for i, name in enumerate(self.names)}
 
     def loadfromjson(self, jsonpath):
         """Carrega a figura 3D descrita no arquivo json"""
@@ -33,19 +412,74 @@ class TriDObject(object):
             loadedjson = json.load(objfile)
             objfile.close()
 
-        for vertix, coord in loadedjson['vertices'].items():
-            self.addvertix(vertix, coord[0], coord[1], coord[2])
+        vertices = loadedjson['vertices']
+        self.setcoords(vertices.keys(), numpy.array(list(vertices.values()), dtype=float).reshape(-1, 3))
 
+        # As arestas sao listadas nos dois sentidos no json; um conjunto elimina as repeticoes em uma unica passada
+        nameindex = self.nameindex
+        edgeset = set()
         for src, dsts in loadedjson['edges'].items():
+            srcindex = nameindex[src]
             for dst in dsts:
-                self.addedge(src, dst)
+                dstindex = nameindex[dst]
+                edgeset.add((srcindex, dstindex) if srcindex < dstindex else (dstindex, srcindex))
+        edges = numpy.array(list(edgeset), dtype=numpy.intp).reshape(-1, 2)
+        self.setedges(edges[numpy.lexsort((edges[:, 1], edges[:, 0]))])
 
         for facename, verticeslist in loadedjson['faces'].items():
             self.addface(facename, verticeslist)
 
+    def loadfromarrays(self, names, coords, edges, facenames, faceoffsets, faceindices):
+        """Carrega a figura 3D a partir das matrizes do formato compacto: coords (N, 4) em coordenadas homogeneas, usada
+        diretamente e sem copia, edges (E, 2) com cada aresta uma unica vez e as faces como faceoffsets e faceindices
+        (ver meshfiles). Somente as faces sao convertidas para dicionario"""
+        self.coordsbuffer = coords
+        self.nvertices = coords.shape[0]
+        self.transform = None
+        self.basebounds = None
+        self.planecache = None
+        self.names = list(names)
+        self.nameindex = {name: i for i, name in enumerate(self.names)}
+
+        self.setedges(edges)
+        self.setfaces(facenames, faceoffsets, faceindices)
+
+    def loadfrombinary(self, binarypath):
+        """Carrega a figura 3D gravada no formato binario descrito em meshfiles. A matriz de vertices eh aberta com
+        numpy.memmap e usada diretamente, sem copia"""
+        loaded = meshfiles.readbinary(binarypath)
+        self.loadfromarrays(loaded['names'], loaded['coords'], loaded['edges'], loaded['facenames'],
+                            loaded['faceoffsets'], loaded['faceindices'])
+        if 'facenormals' in loaded:
+            # Planos gravados por savebinary, tambem abertos com memmap (ver faceplanes)
+            self.planecache = (self.faceindices, (loaded['facenormals'], loaded['faceplaneoffsets']))
+
+    def loadfrommesh(self, coords, faceoffsets, faceindices):
+        """Carrega a figura 3D lida por um dos importadores de meshfiles. Os vertices e as faces recebem os nomes v1,
+        v2, ... e f1, f2, ..., e as arestas sao derivadas das faces"""
+        edges = meshfiles.edgesfromfaces(faceoffsets, faceindices)
+        names = ['v%d' % (i + 1) for i in range(coords.shape[0])]
+        facenames = ['f%d' % (i + 1) for i in range(len(faceoffsets) - 1)]
+        self.loadfromarrays(names, coords, edges, facenames, faceoffsets, faceindices)
+
+    def loadfromobj(self, objpath):
+        """Carrega a figura 3D de um arquivo Wavefront OBJ, lido linha a linha"""
+        self.loadfrommesh(*meshfiles.readobj(objpath))
+
+    def loadfromply(self, plypath):
+        """Carrega a figura 3D de um arquivo PLY (ascii ou binario), lido por blocos"""
+        self.loadfrommesh(*meshfiles.readply(plypath))
+
+    def savebinary(self, binarypath):
+        """Grava a figura 3D no formato binario descrito em meshfiles, com os planos das faces (ver faceplanes)"""
+        edges = self.edgearray
+        faceoffsets, faceindices = self.facearrays()
+        meshfiles.writebinary(binarypath, self.names, self.coords, edges, self.faceindices.keys(), faceoffsets,
+                              faceindices, self.faceplanes())
+
     def translation(self, coordinates):
-        """Translada o objeto carregado em self.tridiobject de acordo com as coordenadas de translacao passadas por
-        parametro. Coordinates deve ser uma tupla do tipo (x, y, z)"""
+        """Translada o objeto de acordo com as coordenadas de translacao passadas por parametro. Coordinates deve ser
+        uma tupla do tipo (x, y, z). A translacao eh registrada de forma preguicosa (ver transformed)"""
         dx = coordinates[0]
         dy = coordinates[1]
         dz = coordinates[2]
@@ -54,136 +488,405 @@ class TriDObject(object):
                              [0, 1, 0, dy],
                              [0, 0, 1, dz],
                              [0, 0, 0, 1]]
-        translationmatrix = numpy.matrix(translationmatrix)
-        results = translationmatrix * self.numpymatrix()
-        newtridiobject = TriDObject()
-        newtridiobject.loadfromnumpymatrix(self, results)
-        return newtridiobject
+        return self.transformed(translationmatrix)
 
     def scale(self, rates):
-        """Translada o objeto carregado em self.tridiobject de acordo com as coordenadas de translacao passadas por
-        parametro. Coordinates deve ser uma tupla do tipo (x, y, z)"""
+        """Muda a escala do objeto de acordo com as taxas passadas por parametro. Rates deve ser uma tupla do tipo
+        (sx, sy, sz). A mudanca de escala eh registrada de forma preguicosa (ver transformed)"""
         sx = rates[0]
         sy = rates[1]
         sz = rates[2]
 
         scalematrix = [[sx, 0, 0, 0],
-                             [0, sy, 0, 0],
-                             [0, 0, sz, 0],
-                             [0, 0, 0, 1]]
-        scalematrix = numpy.matrix(scalematrix)
-        results = scalematrix * self.numpymatrix()
-        newtridiobject = TriDObject()
-        newtridiobject.loadfromnumpymatrix(self, results)
-        return newtridiobject
+                       [0, sy, 0, 0],
+                       [0, 0, sz, 0],
+                       [0, 0, 0, 1]]
+        return self.transformed(scalematrix)
 
     def xzmirror(self):
-        """Translada o objeto carregado em self.tridiobject de acordo com as coordenadas de translacao passadas por
-        parametro. Coordinates deve ser uma tupla do tipo (x, y, z)"""
+        """Reflete o objeto no plano xz. A reflexao eh registrada de forma preguicosa (ver transformed)"""
 
         mirrormatrix = [[1, 0, 0, 0],
                         [0, -1, 0, 0],
                         [0, 0, 1, 0],
                         [0, 0, 0, 1]]
-        mirrormatrix = numpy.matrix(mirrormatrix)
-        results = mirrormatrix * self.numpymatrix()
-        newtridiobject = TriDObject()
-        newtridiobject.loadfromnumpymatrix(self, results)
-        return newtridiobject
-
+        return self.transformed(mirrormatrix)
 
     def loadfromnumpymatrix(self, parenttridobject, numpymatrix):
         """Carrega o objeto 3D a partir de uma matriz de pontos e um objeto 3D de referencia. Eh necessario passar um
         objeto de referencia para que se conheca as arestas do objeto, que nao sao representadas nas matrizes de objeto
-        utilizadas nas operacoes matematicas de projecao"""
+        utilizadas nas operacoes matematicas de projecao. A coluna j da matriz corresponde ao vertice de indice j do
+        objeto de referencia"""
         if not isinstance(parenttridobject, TriDObject):
             raise AttributeError('Parametro parenttridobject precisa ser objeto da classe TriDObject')
-        verticesnames = []
 
-        for vertix in parenttridobject.vertices:
-            verticesnames.append(vertix[0])
+        results = numpy.asarray(numpymatrix, dtype=float).T
+        # results[:, 3] eh o valor da coordenada w (coordenadas homogeneas). Divide-se por ele para obter as
+        # coordenadas reais de x, y e z
+        coords = results / results[:, 3:4]
 
-        j = 0
-        for vertix in sorted(verticesnames):
-            # numpymatrix[3, j] eh o valor da coordenada w (coordenadas homogeneas). Divide-se por ele para obter as
-            # coordenadas reais de x, y e z
-            self.addvertix(vertix,
-                           float(numpymatrix[0, j]) / float(numpymatrix[3, j]),
-                           float(numpymatrix[1, j]) / float(numpymatrix[3, j]),
-                           float(numpymatrix[2, j]) / float(numpymatrix[3, j]))
-            j += 1
+        # A topologia eh compartilhada com o objeto de referencia (ver sharedtopology)
+        self.coordsbuffer = numpy.ascontiguousarray(coords)
+        self.nvertices = coords.shape[0]
+        self.transform = None
+        self.basebounds = None
+        self.planecache = None
+        self.names = parenttridobject.names
+        self.nameindex = parenttridobject.nameindex
+        self.edgesbuffer = parenttridobject.edgearray
+        self.edgecount = parenttridobject.edgecount
+        self.csrcache = parenttridobject.csrcache
+        self.faceindices = parenttridobject.faceindices
+        self.cornerscache = parenttridobject.cornerscache
+        self.facearrayscache = parenttridobject.facearrayscache
+        self.refcountcache = parenttridobject.refcountcache
+        self.edgefacescache = parenttridobject.edgefacescache
+        parenttridobject.sharedtopology = True
+        self.sharedtopology = True
 
-        self.edges = parenttridobject.edges
-        self.faces = parenttridobject.faces
+    def unsharetopology(self):
+        """Copia para este objeto as estruturas da topologia, se elas forem compartilhadas com outros objetos. Eh
+        chamado pelas operacoes que alteram a topologia no lugar (addvertix, addedge e addface)"""
+        if not self.sharedtopology:
+            return
+        self.names = list(self.names)
+        self.nameindex = dict(self.nameindex)
+        self.edgesbuffer = self.edgearray.copy()
+        self.faceindices = dict(self.faceindices)
+        self.sharedtopology = False
 
     def addvertix(self, name, x, y, z):
         """Adiciona um vertice"""
-        self.vertices.append((name, x, y, z))
+        self.unsharetopology()
+        if self.transform is not None:
+            self.applytransform()
+        self.basebounds = None
+        if self.nvertices == self.coordsbuffer.shape[0]:
+            # Dobra a capacidade do buffer, de modo que inserir N vertices custe O(N) no total
+            newbuffer = numpy.zeros((max(8, 2 * self.nvertices), 4))
+            newbuffer[:self.nvertices] = self.coords
+            self.coordsbuffer = newbuffer
+        self.coordsbuffer[self.nvertices] = (x, y, z, 1.0)
+        self.nameindex[name] = self.nvertices
+        self.names.append(name)
+        self.nvertices += 1
 
     def addedge(self, vertixa_name, vertixb_name):
         """Adiciona uma aresta"""
-        if vertixa_name not in self.edges.keys():
-            self.edges[vertixa_name] = []
-        if vertixb_name not in self.edges.keys():
-            self.edges[vertixb_name] = []
-        if vertixb_name not in self.edges[vertixa_name]:
-            self.edges[vertixa_name].append(vertixb_name)
-        if vertixa_name not in self.edges[vertixb_name]:
-            self.edges[vertixb_name].append(vertixa_name)
+        self.unsharetopology()
+        vertixa = self.nameindex[vertixa_name]
+        vertixb = self.nameindex[vertixb_name]
+        edge = (vertixa, vertixb) if vertixa < vertixb else (vertixb, vertixa)
+        if self.edgeset is None:
+            self.edgeset = set(map(tuple, self.edgearray.tolist()))
+        if edge in self.edgeset:
+            return
+        self.edgeset.add(edge)
+        if self.edgecount == self.edgesbuffer.shape[0]:
+            # Dobra a capacidade do buffer, como em addvertix
+            newbuffer = numpy.zeros((max(8, 2 * self.edgecount), 2), dtype=numpy.intp)
+            newbuffer[:self.edgecount] = self.edgearray
+            self.edgesbuffer = newbuffer
+        self.edgesbuffer[self.edgecount] = edge
+        self.edgecount += 1
+        self.csrcache = None
 
     def addface(self, facename, vertices_names):
-        """Adiciona uma aresta"""
-        self.faces[facename] = vertices_names
+        """Adiciona uma face"""
+        self.unsharetopology()
+        if not isinstance(self.faceindices, dict):
+            self.faceindices = dict(self.faceindices)
+        self.faceindices[facename] = [self.nameindex[name] for name in vertices_names]
+        self.cornerscache = None
+        self.planecache = None
+        self.facearrayscache = None
+        self.refcountcache = None
 
     def removeface(self, facename):
-        del self.faces[facename]
+        self.removefaces([facename])
+
+    def removefaces(self, facenames):
+        """Remove de uma so vez as faces passadas por parametro e, em seguida, os vertices e arestas que ficarem orfaos
+        (ver keepfaces)"""
+        removed = set(facenames)
+        missing = removed.difference(self.faceindices)
+        if missing:
+            raise KeyError(missing.pop())
+        self.keepfaces([facename not in removed for facename in self.faceindices])
+
+    def keepfaces(self, mask):
+        """Mantem somente as faces marcadas na mascara booleana (F,), na ordem de self.faceindices. As contagens de
+        referencias dos vertices sao decrementadas pelas faces removidas; os vertices que chegarem a zero, e as arestas
+        que os usam, sao removidos com uma unica compactacao"""
+        mask = numpy.asarray(mask, dtype=bool).reshape(-1)
+        if mask.all():
+            return
+        faceoffsets, faceindices = self.facearrays()
+        lengths = numpy.diff(faceoffsets)
+        entries = numpy.repeat(mask, lengths)
+        refcounts = self.facerefcounts() - numpy.bincount(faceindices[~entries], minlength=self.nvertices)
+
+        keptoffsets = numpy.zeros(int(mask.sum()) + 1, dtype=numpy.intp)
+        numpy.cumsum(lengths[mask], out=keptoffsets[1:])
+        facenames = [facename for facename, keep in zip(self.faceindices, mask.tolist()) if keep]
+        planes = self.currentplanes()
+        self.setfaces(facenames, keptoffsets, faceindices[entries], refcounts)
+        if planes is not None:
+            self.planecache = (self.faceindices, (planes[0][mask], planes[1][mask]))
         self.updatevertices()
 
     def updatevertices(self):
-        def notpartofanyface(vertixname):
-            for face in self.faces.values():
-                if vertixname in face:
-                    return False
-            return True
-
-        # Seleciona para remocao vertices que nao aparecam em mais nenhuma face da figura
-        removevertixlist = []
-        for vertix in self.vertices:
-            if notpartofanyface(vertix[0]):
-                removevertixlist.append(vertix)
-                del self.edges[vertix[0]]
-
-        # Remove arestas que contem vertices a serem removidos
-        for dsts in self.edges.values():
-            for vertix in removevertixlist:
-                if vertix[0] in dsts:
-                    dsts.remove(vertix[0])
-
-        # Remove todos os vertices listados para remocao
-        for vertix in removevertixlist:
-            self.vertices.remove(vertix)
+        """Remove os vertices que nao aparecem em nenhuma face (contagem de referencias zero) e as arestas que os usam,
+        compactando as matrizes e renumerando os indices de arestas e faces de uma so vez"""
+        refcounts = self.facerefcounts()
+        used = refcounts > 0
+        if used.all():
+            return
+
+        keep = numpy.flatnonzero(used)
+        remap = numpy.cumsum(used) - 1
+        edges = self.edgearray
+        # Remove arestas que contem vertices removidos
+        self.setedges(remap[edges[used[edges[:, 0]] & used[edges[:, 1]]]])
+        names = self.names
+        # A transformacao pendente, se houver, eh mantida: ela sera aplicada somente aos vertices restantes
+        self.coordsbuffer = self.coordsbuffer[:self.nvertices][keep]
+        self.nvertices = len(keep)
+        self.basebounds = None
+        self.names = [names[i] for i in keep.tolist()]
+        self.nameindex = {name: i for i, name in enumerate(self.names)}
+
+        faceoffsets, faceindices = self.facearrays()
+        planes = self.currentplanes()
+        self.setfaces(list(self.faceindices), faceoffsets, remap[faceindices], refcounts[keep])
+        if planes is not None:
+            self.planecache = (self.faceindices, planes)
+
+    def currentplanes(self):
+        """Planos das faces guardados por faceplanes, se ainda forem validos, ou None"""
+        if self.planecache is not None and self.planecache[0] is self.faceindices:
+            return self.planecache[1]
+        return None
+
+    def nedges(self):
+        """Numero de arestas unicas do objeto"""
+        return self.edgecount
+
+    def nbytes(self):
+        """Estimativa do espaco ocupado pelos vertices e pela topologia do objeto, em bytes"""
+        entries = len(self.facearrays()[1])
+        return self.nvertices * 4 * 8 + self.edgearray.nbytes + entries * 8
 
     def numpymatrix(self):
-        xrow = []
-        yrow = []
-        zrow = []
-        wrow = [1] * len(self.vertices) # Coordenadas homogeneas possuem w. Nessa conversao, w=1 para todas coordenadas
-        for vertix in sorted(self.vertices, key=lambda vertix: vertix[0]):
-            xrow.append(vertix[1])
-            yrow.append(vertix[2])
-            zrow.append(vertix[3])
-        return numpy.matrix([xrow, yrow, zrow, wrow])
+        # Coordenadas homogeneas possuem w. As colunas seguem a ordem dos indices dos vertices
+        return numpy.matrix(self.coords.T)
+
+
+
+def loadmodel(objectpath=OBJJSONPATH):
+    """Carrega e retorna a figura 3D do arquivo passado por parametro. Arquivos no formato binario (ver meshfiles) sao
+    reconhecidos pela assinatura e abertos diretamente com numpy.memmap. Arquivos .obj e .ply sao lidos pelos
+    importadores de meshfiles; os demais sao lidos como json"""
+    tridiobject = TriDObject()
+    extension = objectpath.lower().rsplit('.', 1)[-1]
+    if meshfiles.isbinary(objectpath):
+        tridiobject.loadfrombinary(objectpath)
+    elif extension == 'obj':
+        tridiobject.loadfromobj(objectpath)
+    elif extension == 'ply':
+        tridiobject.loadfromply(objectpath)
+    else:
+        tridiobject.loadfromjson(objectpath)
+    tridiobject.faceplanes()
+    return tridiobject
+
+
+def readviewpoints(viewpointsfile):
+    """Le um ponto de vista por linha (X Y Z, separados por espacos ou virgulas). Linhas vazias e iniciadas por # sao
+    ignoradas"""
+    viewpoints = []
+    for line in viewpointsfile:
+        line = line.split('#', 1)[0].replace(',', ' ').split()
+        if line:
+            viewpoints.append(tuple(float(value) for value in line[:3]))
+    return viewpoints
+
+
+class MaskedProjection(object):
+    """Projecao expressa como uma mascara de visibilidade sobre a topologia do modelo, sem copias nem compactacao:
+
+    self.source: TriDObject projetado. Ele nao eh alterado, e a sua topologia eh compartilhada
+
+    self.matrix: matriz 4x4 da projecao, aplicada de forma preguicosa (ver TriDObject.transformed)
+
+    self.visiblefaces: mascara booleana (F,) das faces visiveis, na ordem de self.source.faceindices
+
+    Para o desenho, tem a mesma interface de leitura do TriDObject retornado por getprojection (nvertices, names,
+    coords, bounds, edgearray e nedges), com os indices do modelo: coords e names cobrem todos os vertices, e edgearray
+    contem somente as arestas entre vertices visiveis. compact retorna o TriDObject compactado"""
+    def __init__(self, source, matrix, visiblefaces):
+        self.source = source
+        self.matrix = matrix
+        self.visiblefaces = numpy.asarray(visiblefaces, dtype=bool)
+        self.projected = source.transformed(matrix)
+        self.vertexmaskcache = None
+        self.edgemaskcache = None
+
+    @property
+    def names(self):
+        return self.source.names
+
+    @property
+    def coords(self):
+        return self.projected.coords
+
+    @property
+    def visiblevertices(self):
+        """Mascara (N,) dos vertices que pertencem a alguma face visivel (todos, se todas as faces forem visiveis)"""
+        if self.vertexmaskcache is None:
+            if self.visiblefaces.all():
+                self.vertexmaskcache = numpy.ones(self.source.nvertices, dtype=bool)
+            else:
+                faceoffsets, faceindices = self.source.facearrays()
+                entries = numpy.repeat(self.visiblefaces, numpy.diff(faceoffsets))
+                self.vertexmaskcache = numpy.bincount(faceindices[entries], minlength=self.source.nvertices) > 0
+        return self.vertexmaskcache
+
+    @property
+    def visibleedges(self):
+        """Mascara (E,) das arestas entre vertices visiveis, na ordem de self.source.edgearray"""
+        if self.edgemaskcache is None:
+            edges = self.source.edgearray
+            used = self.visiblevertices
+            self.edgemaskcache = used[edges[:, 0]] & used[edges[:, 1]]
+        return self.edgemaskcache
+
+    @property
+    def nvertices(self):
+        return int(numpy.count_nonzero(self.visiblevertices))
+
+    @property
+    def edgearray(self):
+        return self.source.edgearray[self.visibleedges]
+
+    def nedges(self):
+        return int(numpy.count_nonzero(self.visibleedges))
+
+    def bounds(self):
+        return finitebounds(self.coords[self.visiblevertices, :3])
+
+    def compact(self):
+        """Retorna um novo TriDObject somente com as faces visiveis e os seus vertices e arestas (ver
+        TriDObject.keepfaces). A multiplicacao pela matriz da projecao eh feita somente nos vertices mantidos"""
+        projected = self.source.transformed(self.matrix)
+        projected.keepfaces(self.visiblefaces)
+        return projected
+
+
+class ProjectionCache(object):
+    """Cache LRU de projecoes. As chaves sao tuplas (versao do modelo, opcoes de descarte, ponto de vista quantizado,
+    plano de projecao; ver makekey) e os valores sao os TriDObject de projecao. As projecoes guardadas sao somente
+    leitura: put protege os vertices contra escrita e guarda uma copia da projecao, e get retorna uma nova copia (ver
+    TriDObject.sharedcopy), de modo que alteracoes nas projecoes retornadas nao cheguem ao cache. Quando o numero de
+    entradas passa de maxentries ou o espaco estimado (ver TriDObject.nbytes) passa de maxbytes, as entradas usadas ha
+    mais tempo sao descartadas. Qualquer um dos limites pode ser None. Os contadores hits, misses e evictions registram
+    o uso do cache"""
+    def __init__(self, maxentries=256, maxbytes=None):
+        self.maxentries = maxentries
+        self.maxbytes = maxbytes
+        self.entries = collections.OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Permite que o cache seja usado ao mesmo tempo pela interface e por uma projectionworker.ProjectionWorker
+        self.lock = threading.Lock()
 
+    @staticmethod
+    def makekey(modelversion, pointofview, plane=(), frustumculling=False, window=None):
+        """plane identifica o plano de projecao, se nao for o padrao Z=0 (ver Camera.planekey). frustumculling e window
+        sao as opcoes de descarte do PerspectiveProjection, que mudam as faces mantidas na projecao"""
+        culling = (True, None if window is None else tuple(window)) if frustumculling else (False, None)
+        return (modelversion,) + culling + tuple(int(round(coordinate / VIEWPOINTQUANTUM))
+                                                 for coordinate in tuple(pointofview) + tuple(plane))
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0].sharedcopy()
+
+    def put(self, key, projected):
+        # Os vertices sao compartilhados com a projecao passada, que tambem fica protegida contra escrita
+        if projected.transform is not None:
+            projected.applytransform()
+        projected.coordsbuffer.flags.writeable = False
+        projected = projected.sharedcopy()
+        size = projected.nbytes()
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            self.entries[key] = (projected, size)
+            self.nbytes += size
+            while self.entries and ((self.maxentries is not None and len(self.entries) > self.maxentries) or
+                                    (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+                self.nbytes -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.nbytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
 
 
 class PerspectiveProjection(object):
-    def __init__(self):
-        self.tridiobject = None
+    def __init__(self, cache=None, instrumentation=NOINSTRUMENTATION, frustumculling=False, window=None, camera=None):
+        """cache eh um ProjectionCache opcional. Com ele, getprojection reaproveita projecoes ja calculadas para o mesmo
+        modelo e o mesmo ponto de vista (quantizado, ver VIEWPOINTQUANTUM). instrumentation eh um
+        instrumentation.Instrumentation opcional, que registra o tempo e as contagens de cada etapa de getprojection.
+
+        Com frustumculling, getprojection descarta, antes de qualquer trabalho por vertice, as faces fora do frustum
+        do ponto de vista (ver spatialindex), consultando uma hierarquia de volumes envolventes construida uma vez por
+        modelo. Faces com algum vertice atras do ponto de vista sao sempre descartadas nesse modo. window, uma tupla
+        (xmin, ymin, xmax, ymax) no plano de projecao, limita tambem as laterais do frustum.
+
+        camera eh um camera.Camera opcional com o plano de projecao (Z=0 por padrao). O ponto de vista da camera eh o
+        passado a getprojection, e as matrizes sao reaproveitadas enquanto ele e o plano nao mudarem. A projecao
+        retornada tem, em x e y, as coordenadas dos pontos nos eixos do plano de projecao, e z=0"""
         self.projection = None
+        self.cache = cache
+        self.instrumentation = instrumentation
+        self.frustumculling = frustumculling
+        self.window = window
+        self.tridiobject = None
+        self.spatialindex = None
+        self.spatialindexversion = None
+        self.camera = camera if camera is not None else Camera()
+        # A camera guarda o ultimo ponto de vista; o lock permite projetar o mesmo modelo a partir de varias threads
+        self.cameralock = threading.Lock()
+
+    @property
+    def tridiobject(self):
+        return self._tridiobject
+
+    @tridiobject.setter
+    def tridiobject(self, tridiobject):
+        # Cada atribuicao recebe uma nova versao (ver MODELVERSIONS), para que projecoes e hierarquias de um modelo
+        # anterior, ou de outro projetor, nao sejam reutilizadas
+        self._tridiobject = tridiobject
+        self.modelversion = next(MODELVERSIONS)
 
     def loadtridiobject(self, objectpath=OBJJSONPATH):
-        self.tridiobject = TriDObject()
-        self.tridiobject.loadfromjson(objectpath)
+        """Carrega a figura 3D do arquivo passado por parametro (ver loadmodel)"""
+        self.tridiobject = loadmodel(objectpath)
 
     def tridiobjecttranslation(self, coordinates):
         """Translada o objeto carregado em self.tridiobject de acordo com as coordenadas de translacao passadas por
@@ -199,75 +902,68 @@ class PerspectiveProjection(object):
                              [0, 1, 0, dy],
                              [0, 0, 1, dz],
                              [0, 0, 0, 1]]
-        translationmatrix = numpy.matrix(translationmatrix)
-        results = translationmatrix * self.tridiobject.numpymatrix()
-        newtridiobject = TriDObject()
-        newtridiobject.loadfromnumpymatrix(self.tridiobject, results)
-        self.tridiobject = newtridiobject
+        self.tridiobject = self.tridiobject.transformed(translationmatrix)
         return True
 
     def perspectivematrix(self, pointofview):
-        """Calcula a matriz perspectiva considerando o plano de projecao em Z=0. O ponto de vista PV(a,b,c) eh passado
-        como parametro do metodo em forma de uma tupla (a, b, c)
-        a = pointofview[0]
-        b = pointofview[1]
-        c = pointofview[2]"""
-
-        # Primeiro passo: calcular vetor normal ao plano de projecao. Como o plano de projecao eh Z=0, o vetor eh o
-        # versor k, paralelo ao eixo Z
-
-        nx = 0
-        ny = 0
-        nz = 1
-
-        # Segundo passo: calcular d0 a partir de um ponto (x0, y0, z0) em cima do plano de projecao. Escolhe-se o ponto
-        # (0,0,0) para facilitar os calculos
-        # d0 = x0 * nx + y0 * ny + z0 * nz = 0 * 0 + 0 * 0 + 0 * 1 = 0
-
-        d0 = 0
-
-        # Terceiro passo: calcular d1, que depende dos dados do plano de projecao e do ponto de vista
-
-        d1 = pointofview[0] * nx + pointofview[1] * ny + pointofview[2] * nz
+        """Retorna a matriz perspectiva (numpy.matrix 4x4) para o ponto de vista PV(a,b,c), passado como uma tupla
+        (a, b, c), sobre o plano de projecao de self.camera (Z=0 por padrao). A matriz eh montada pela camera (ver
+        camera.perspectivematrices) e reaproveitada enquanto o ponto de vista e o plano nao mudarem"""
+        with self.cameralock:
+            self.camera.setviewpoint(pointofview)
+            return numpy.asmatrix(self.camera.perspectivematrix())
 
-        # Quarto passo: calculo de d, dado simplesmente por d0 - d1
+    def projectionmatrix(self, pointofview):
+        """Retorna a matriz 4x4 combinada de self.camera (ver Camera.projectionmatrix) para o ponto de vista
+        pointofview"""
+        with self.cameralock:
+            self.camera.setviewpoint(pointofview)
+            return self.camera.projectionmatrix()
 
-        d = d0 - d1
+    def perspectivematrices(self, viewpoints):
+        """Versao em lote de perspectivematrix: recebe uma matriz (M, 3) de pontos de vista e retorna um tensor
+        (M, 4, 4) com as M matrizes empilhadas. As matrizes ja incluem a passagem para os eixos do plano de projecao de
+        self.camera (ver Camera.projectionmatrix), que para o plano Z=0 nao altera a matriz perspectiva"""
+        matrices = perspectivematrices(viewpoints, self.camera.planenormal, self.camera.planepoint)
+        if self.camera.isdefaultplane():
+            return matrices
+        return self.camera.planematrix() @ matrices
 
-        # Quinto passo: montar a matriz de projecao com os dados calculados
-        # A matriz eh uma lista de listas na qual cada lista interior eh uma linha da matriz
+    def hiddenfacesmask(self, viewpoints, faces=None):
+        """Versao vetorizada do teste de faces ocultas (back-face culling). Recebe uma matriz (M, 3) de pontos de vista
+        e retorna uma matriz booleana (M, F), verdadeira onde a face esta de costas para o ponto de vista. As colunas
+        seguem a ordem de self.tridiobject.faceindices; faces, se passada, restringe o teste as faces selecionadas"""
+        viewpoints = numpy.asarray(viewpoints, dtype=float).reshape(-1, 3)
+        normals, offsets = self.tridiobject.faceplanes()
+        if faces is not None:
+            normals = normals[faces]
+            offsets = offsets[faces]
 
-        returnmatrix = [[d + pointofview[0] * nx, pointofview[0] * ny, pointofview[0] * nz, - pointofview[0] * d0],
-                        [pointofview[1] * nx, d + pointofview[1] * ny, pointofview[1] * nz, - pointofview[1] * d0],
-                        [pointofview[2] * nx, pointofview[2] * ny, d + pointofview[2] * nz, - pointofview[2] * d0],
-                        [nx, ny, nz, - d1]]
-
-        # Retorna uma matriz do pacote numpy, construida a partir da matriz construida acima. As matrizes do numpy
-        # permitem utilizar facilmente operacoes basicas de matrizes sobre elas, como a multiplicacao
-        return numpy.matrix(returnmatrix)
+        # Produto escalar entre a normal de cada face e o vetor que vai do primeiro vertice da face ao ponto de vista:
+        # normal . (pv - v1) = normal . pv - normal . v1, com os planos guardados por faceplanes
+        return viewpoints @ normals.T - offsets < 0
 
     def detecthiddenfaces(self, pointofview):
-        hiddenfaces = []
-        for facename, vertices in self.tridiobject.faces.items():
-            v1 = self.tridiobject.get_vertix(vertices[0])
-            v2 = self.tridiobject.get_vertix(vertices[1])
-            v3 = self.tridiobject.get_vertix(vertices[2])
-
-            vector1 = numpy.array([v3[1] - v2[1], v3[2] - v2[2], v3[3] - v2[3]])
-            vector2 = numpy.array([v1[1] - v2[1], v1[2] - v2[2], v1[3] - v2[3]])
-            #print(vector1)
-            #print(vector2)
-            normalvector = numpy.cross(vector1, vector2)
-            #print('normal a face %s' % (facename))
-            #print(normalvector)
-
-            povvector = [pointofview[0] - v1[1], pointofview[1] - v1[2], pointofview[2] - v1[3]]
-            scalarproduct = numpy.dot(normalvector, povvector)
-            #print(scalarproduct)
-            if scalarproduct < 0:
-                hiddenfaces.append(facename)
-        return hiddenfaces
+        hiddenmask = self.hiddenfacesmask(pointofview)[0]
+        facenames = list(self.tridiobject.faceindices.keys())
+        return [facenames[i] for i in numpy.flatnonzero(hiddenmask).tolist()]
+
+    def buildspatialindex(self):
+        """Constroi a hierarquia de volumes envolventes das faces de self.tridiobject, se ela ainda nao existir para a
+        versao atual do modelo"""
+        if self.spatialindex is None or self.spatialindexversion != self.modelversion:
+            faceoffsets, faceindices = self.tridiobject.facearrays()
+            self.spatialindex = spatialindex.BoundingVolumeHierarchy(self.tridiobject.coords, faceoffsets, faceindices)
+            self.spatialindexversion = self.modelversion
+        return self.spatialindex
 
+    def frustummask(self, pointofview):
+        """Retorna a mascara booleana (F,) das faces que podem aparecer na projecao a partir de pointofview: faces
+        inteiramente a frente do ponto de vista e que cruzam a janela self.window, se houver"""
+        with self.cameralock:
+            self.camera.setviewpoint(pointofview)
+            frustum = spatialindex.Frustum.fromcamera(self.camera, self.window)
+        return self.buildspatialindex().query(frustum)
 
     def getprojection(self, pointofview):
         """Esse metodo recebe uma tupla (X, Y, Z) como parametro, o qual representa as coordenadas do ponto de vista
@@ -277,16 +973,98 @@ class PerspectiveProjection(object):
         O objeto TriDObject de retorno possui vertices e arestas contidos no plano de projecao Z=0, o que implica que
         ele forma uma figura em duas dimensoes (2D). Essa figura deve ser construida em uma tela de pintura do Tkinter
         ou similar, com coordenadas do display utilizado para exibicao"""
+        instrumentation = self.instrumentation
         if not self.tridiobject:
-            self.loadtridiobject()
+            with instrumentation.stage('loadtridiobject') as stage:
+                self.loadtridiobject()
+                if instrumentation.enabled:
+                    stage.count(vertices=self.tridiobject.nvertices, edges=self.tridiobject.nedges(),
+                                faces=len(self.tridiobject.faceindices))
 
-        hiddenfaces = self.detecthiddenfaces(pointofview)
-        perspectivematrix = self.perspectivematrix(pointofview)
-        results = perspectivematrix * self.tridiobject.numpymatrix()
-        self.projection = TriDObject()
-        self.projection.loadfromnumpymatrix(self.tridiobject, results)
-        for face in hiddenfaces:
-            self.projection.removeface(face)
+        if self.cache is not None:
+            with instrumentation.stage('cache') as stage:
+                plane = () if self.camera.isdefaultplane() else self.camera.planekey()
+                cachekey = ProjectionCache.makekey(self.modelversion, pointofview, plane, self.frustumculling,
+                                                   self.window)
+                cached = self.cache.get(cachekey)
+                stage.count(hits=int(cached is not None))
+            if cached is not None:
+                self.projection = cached
+                return self.projection
+
+        visible = self.visiblefacesmask(pointofview)
+        with instrumentation.stage('perspectivematrix'):
+            projectionmatrix = self.projectionmatrix(pointofview)
+        with instrumentation.stage('removeface') as stage:
+            # A remocao compacta os vertices antes da multiplicacao, que fica pendente na projecao
+            self.projection = MaskedProjection(self.tridiobject, projectionmatrix, visible).compact()
+            if instrumentation.enabled:
+                stage.count(faces=len(visible) - int(visible.sum()), vertices=self.projection.nvertices,
+                            edges=self.projection.nedges())
+        with instrumentation.stage('homogeneousdivide', vertices=self.projection.nvertices):
+            if self.projection.transform is not None:
+                self.projection.applytransform()
+        if self.cache is not None:
+            self.cache.put(cachekey, self.projection)
 
         # Retorna o TriDObject de projecao, armazenado no atributo da classe
         return self.projection
+
+    def visiblefacesmask(self, pointofview):
+        """Retorna a mascara booleana (F,) das faces que aparecem na projecao a partir de pointofview, na ordem de
+        self.tridiobject.faceindices: as que passam pelo teste de faces ocultas e, com frustumculling, estao no
+        frustum. Com frustumculling, as faces fora do frustum sao descartadas pela hierarquia e o teste de faces
+        ocultas eh feito somente nas restantes"""
+        instrumentation = self.instrumentation
+        if not self.frustumculling:
+            with instrumentation.stage('detecthiddenfaces', faces=len(self.tridiobject.faceindices)) as stage:
+                hidden = self.hiddenfacesmask(pointofview)[0]
+                if instrumentation.enabled:
+                    stage.count(hiddenfaces=int(hidden.sum()))
+            return ~ hidden
+
+        with instrumentation.stage('frustumculling', faces=len(self.tridiobject.faceindices)) as stage:
+            visible = self.frustummask(pointofview)
+            candidates = numpy.flatnonzero(visible)
+            if instrumentation.enabled:
+                stage.count(culledfaces=len(visible) - len(candidates))
+        with instrumentation.stage('detecthiddenfaces', faces=len(candidates)) as stage:
+            hidden = self.hiddenfacesmask(pointofview, candidates)[0]
+            visible[candidates[hidden]] = False
+            if instrumentation.enabled:
+                stage.count(hiddenfaces=int(hidden.sum()))
+        return visible
+
+    def getmaskedprojection(self, pointofview):
+        """Como getprojection, mas retorna um MaskedProjection: a projecao fica expressa como mascaras de visibilidade
+        sobre a topologia de self.tridiobject, sem compactacao e sem copias. Nao usa o cache"""
+        if not self.tridiobject:
+            self.loadtridiobject()
+        tridiobject = self.tridiobject
+        visible = self.visiblefacesmask(pointofview)
+        return MaskedProjection(tridiobject, self.projectionmatrix(pointofview), visible)
+
+    def getprojections(self, viewpoints):
+        """Projeta o objeto carregado a partir de varios pontos de vista de uma so vez. viewpoints eh uma matriz (M, 3)
+        com um ponto de vista por linha. As M matrizes perspectiva sao empilhadas em um tensor e aplicadas a todos os
+        vertices em uma unica multiplicacao. Retorna uma tupla (projected, visiblefaces, visiblevertices):
+
+        projected: matriz (M, N, 2) com as coordenadas x e y de cada um dos N vertices no plano de projecao Z=0, na
+        ordem dos indices de self.tridiobject
+
+        visiblefaces: matriz booleana (M, F) indicando, para cada ponto de vista, quais faces nao sao ocultas. As
+        colunas seguem a ordem de self.tridiobject.faceindices
+
+        visiblevertices: matriz booleana (M, N) indicando quais vertices pertencem a alguma face visivel, ou seja,
+        quais vertices seriam mantidos por getprojection"""
+        if not self.tridiobject:
+            self.loadtridiobject()
+
+        viewpoints = numpy.asarray(viewpoints, dtype=float).reshape(-1, 3)
+        coords = self.tridiobject.coords
+        matrices = self.perspectivematrices(viewpoints)
+        results = numpy.einsum('mij,nj->mni', matrices, coords)
+        projected = results[:, :, :2] / results[:, :, 3:4]
+
+        visiblefaces = ~ self.hiddenfacesmask(viewpoints)
+        return projected, visiblefaces, self.tridiobject.vertexmask(visiblefaces)
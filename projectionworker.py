@@ -0,0 +1,122 @@
+import threading
+
+__author__ = 'https://github.com/rafaiska'
+
+# Projecao em segundo plano: uma thread separada carrega o modelo e calcula as projecoes pedidas, de modo que a
+# interface nao fique bloqueada em modelos grandes. Somente o pedido mais recente importa: pedidos feitos enquanto a
+# thread esta ocupada substituem o pedido pendente (sao agrupados), e um novo pedido descarta o resultado do pedido em
+# andamento. Pedidos continuos, como os do arraste do mouse, podem manter esse resultado, de modo que a figura
+# acompanhe o movimento na velocidade da projecao em vez de so ser desenhada quando o movimento parar. Nao depende do
+# Tk: a interface consulta os resultados com result, no seu proprio laco de eventos (em view, com after).
+
+
+class ProjectionWorker(object):
+    """Calcula em uma thread as projecoes pedidas por submit, chamando project(pointofview) (por padrao,
+    projector.getprojection). projector eh um PerspectiveProjection (ou equivalente); se o seu modelo ainda nao estiver
+    carregado, ele eh carregado pela thread antes do primeiro pedido.
+
+    Os contadores completed, coalesced e superseded registram os pedidos projetados e entregues, os substituidos antes
+    de comecarem e os descartados por terem sido superados durante o calculo"""
+    def __init__(self, projector, project=None):
+        self.projector = projector
+        self.project = project if project is not None else projector.getprojection
+        self.condition = threading.Condition()
+        # Pedido pendente, uma tupla (requestid, pointofview), e identificador do pedido mais recente
+        self.request = None
+        self.requestid = 0
+        # Resultados de pedidos com identificador menor que validfrom sao descartados
+        self.validfrom = 0
+        # Resultado ainda nao entregue, uma tupla (requestid, pointofview, projected, error)
+        self.finished = None
+        self.busy = False
+        self.stopped = False
+        self.completed = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.thread = threading.Thread(target=self.run, name='projectionworker', daemon=True)
+
+    def start(self):
+        # O carregamento do modelo conta como trabalho em andamento
+        with self.condition:
+            self.busy = True
+        self.thread.start()
+        return self
+
+    def submit(self, pointofview, supersede=True):
+        """Pede a projecao a partir de pointofview, substituindo o pedido pendente. Com supersede, o resultado do
+        pedido em andamento tambem eh descartado; sem supersede, ele ainda eh entregue, se ficar pronto antes. Retorna o
+        identificador do pedido"""
+        with self.condition:
+            if self.request is not None:
+                self.coalesced += 1
+            self.requestid += 1
+            if supersede:
+                self.validfrom = self.requestid
+            self.request = (self.requestid, tuple(pointofview))
+            self.condition.notify()
+            return self.requestid
+
+    def cancel(self):
+        """Descarta o pedido pendente e o resultado do pedido em andamento, se houver"""
+        with self.condition:
+            self.requestid += 1
+            self.validfrom = self.requestid
+            self.request = None
+            self.finished = None
+
+    def pending(self):
+        """Verifica se ha algum pedido pendente, em andamento ou com resultado ainda nao entregue"""
+        with self.condition:
+            return self.request is not None or self.busy or self.finished is not None
+
+    def result(self):
+        """Retorna, sem bloquear, o resultado mais recente como uma tupla (requestid, pointofview, projected,
+        error), ou None se ele ainda nao estiver pronto. error eh a excecao levantada pela projecao, ou None. Cada
+        resultado eh entregue uma unica vez"""
+        with self.condition:
+            finished = self.finished
+            self.finished = None
+            return finished
+
+    def stop(self, timeout=None):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def run(self):
+        try:
+            if not self.projector.tridiobject:
+                self.projector.loadtridiobject()
+        except Exception as error:
+            with self.condition:
+                self.finished = (self.requestid, None, None, error)
+        finally:
+            with self.condition:
+                self.busy = False
+
+        while True:
+            with self.condition:
+                while self.request is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                requestid, pointofview = self.request
+                self.request = None
+                self.busy = True
+
+            projected = None
+            error = None
+            try:
+                projected = self.project(pointofview)
+            except Exception as exception:
+                error = exception
+
+            with self.condition:
+                self.busy = False
+                if requestid >= self.validfrom:
+                    self.finished = (requestid, pointofview, projected, error)
+                    self.completed += 1
+                else:
+                    self.superseded += 1
@@ -0,0 +1,107 @@
+import struct
+import zlib
+import numpy
+from viewport import Viewport
+
+__author__ = 'https://github.com/rafaiska'
+
+# Backend de desenho sem Tk: as arestas de uma projecao sao rasterizadas em uma imagem RGB (matriz numpy uint8
+# (altura, largura, 3)), que pode ser gravada em PPM ou PNG. Serve para gerar imagens em servidores sem display.
+
+SCREEN_HEIGHT = 600
+SCREEN_WIDTH = 800
+BACKGROUND = (0, 0, 0)
+FOREGROUND = (0, 255, 0)
+
+
+def newimage(width=SCREEN_WIDTH, height=SCREEN_HEIGHT, background=BACKGROUND):
+    image = numpy.empty((height, width, 3), dtype=numpy.uint8)
+    image[:, :] = background
+    return image
+
+
+def linesamples(segments):
+    """Gera de uma so vez todos os pontos de todos os segmentos (algoritmo DDA vetorizado). segments eh uma matriz
+    (E, 4) com as coordenadas de tela (x0, y0, x1, y1) de cada segmento, ja truncadas; cada segmento recebe
+    max(|dx|, |dy|) + 1 amostras. Retorna uma tupla (owner, t, points): o segmento de cada amostra, a sua posicao t
+    (entre 0 e 1) ao longo dele e a matriz (S, 2) de pixels (x, y)"""
+    start = segments[:, :2]
+    delta = segments[:, 2:] - start
+    steps = numpy.abs(delta).max(axis=1).astype(numpy.intp)
+    counts = steps + 1
+
+    owner = numpy.repeat(numpy.arange(len(segments)), counts)
+    offsets = numpy.cumsum(counts) - counts
+    position = numpy.arange(counts.sum()) - offsets[owner]
+    t = position / numpy.maximum(steps, 1)[owner]
+    points = numpy.rint(start[owner] + t[:, None] * delta[owner]).astype(numpy.intp)
+    return owner, t, points
+
+
+def rasterizelines(image, segments, color=FOREGROUND):
+    """Desenha de uma so vez os segmentos de reta passados por parametro na imagem. segments eh uma matriz (E, 4) com
+    as coordenadas de tela (x0, y0, x1, y1) de cada segmento. Os pontos sao gerados por linesamples; pontos fora da
+    imagem, e segmentos com extremidades infinitas ou NaN (vertices na profundidade do ponto de vista), sao
+    descartados"""
+    segments = numpy.asarray(segments, dtype=float).reshape(-1, 4)
+    segments = segments[numpy.isfinite(segments).all(axis=1)]
+    if not len(segments):
+        return image
+    # Assim como no canvas do Tk, as coordenadas sao truncadas para inteiros
+    points = linesamples(numpy.trunc(segments))[2]
+
+    height, width = image.shape[:2]
+    inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+    points = points[inside]
+    image[points[:, 1], points[:, 0]] = color
+    return image
+
+
+def projectionsegments(projected, width=SCREEN_WIDTH, height=SCREEN_HEIGHT):
+    """Aplica a projecao o mesmo ajuste a tela de view.MainView.drawprojection (viewport.Viewport.fit) e retorna a
+    matriz (E, 4) com as coordenadas de tela de cada aresta unica"""
+    if not projected.nvertices:
+        return numpy.zeros((0, 4))
+    lower, upper = projected.bounds()
+    xy = Viewport.fit(lower, upper, width, height).map(projected.coords[:, :2])
+    edges = projected.edgearray
+    return numpy.hstack((xy[edges[:, 0]], xy[edges[:, 1]]))
+
+
+def render(projected, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, background=BACKGROUND, color=FOREGROUND):
+    """Desenha a projecao retornada por PerspectiveProjection.getprojection em uma nova imagem width x height"""
+    image = newimage(width, height, background)
+    return rasterizelines(image, projectionsegments(projected, width, height), color)
+
+
+def writeppm(path, image):
+    """Grava a imagem no formato PPM binario (P6)"""
+    height, width = image.shape[:2]
+    with open(path, 'wb') as imagefile:
+        imagefile.write(b'P6\n%d %d\n255\n' % (width, height))
+        imagefile.write(numpy.ascontiguousarray(image, dtype=numpy.uint8).tobytes())
+
+
+def pngchunk(chunktype, data):
+    return struct.pack('>I', len(data)) + chunktype + data + struct.pack('>I', zlib.crc32(chunktype + data))
+
+
+def writepng(path, image, level=6):
+    """Grava a imagem no formato PNG (RGB, 8 bits), usando apenas zlib"""
+    height, width = image.shape[:2]
+    # Cada linha da imagem eh precedida pelo byte do filtro, 0 (nenhum)
+    rows = numpy.zeros((height, width * 3 + 1), dtype=numpy.uint8)
+    rows[:, 1:] = numpy.ascontiguousarray(image, dtype=numpy.uint8).reshape(height, width * 3)
+    with open(path, 'wb') as imagefile:
+        imagefile.write(b'\x89PNG\r\n\x1a\n')
+        imagefile.write(pngchunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        imagefile.write(pngchunk(b'IDAT', zlib.compress(rows.tobytes(), level)))
+        imagefile.write(pngchunk(b'IEND', b''))
+
+
+def writeimage(path, image):
+    """Grava a imagem em PNG ou PPM, de acordo com a extensao do arquivo"""
+    if path.lower().endswith('.png'):
+        writepng(path, image)
+    else:
+        writeppm(path, image)
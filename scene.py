@@ -0,0 +1,144 @@
+import collections
+import numpy
+import projection
+from camera import Camera
+
+__author__ = 'https://github.com/rafaiska'
+
+# Cena com varios objetos: cada geometria (um TriDObject) eh guardada uma unica vez e pode ser posicionada varias vezes
+# por instancias, cada uma com a sua matriz de transformacao 4x4. A memoria ocupada depende apenas das geometrias
+# distintas; uma instancia a mais custa somente a sua matriz.
+
+
+class Scene(object):
+    """Conjunto de geometrias compartilhadas e de instancias posicionadas na cena.
+
+    self.geometries: um dicionario NOME_DA_GEOMETRIA -> TriDObject
+
+    self.instances: um dicionario ordenado NOME_DA_INSTANCIA -> (NOME_DA_GEOMETRIA, matriz 4x4 numpy), onde a matriz
+    leva as coordenadas da geometria para as coordenadas do mundo
+
+    getprojection tem a mesma interface de PerspectiveProjection.getprojection e pode substitui-lo, por exemplo, em
+    animation.Animation e em view.MainView.drawprojection. Os vertices e faces da projecao recebem o nome da instancia
+    como prefixo (INSTANCIA.VERTICE)"""
+    def __init__(self):
+        self.geometries = {}
+        self.instances = collections.OrderedDict()
+        self.camera = Camera()
+        self.projection = None
+
+    def addgeometry(self, name, tridiobject):
+        if not isinstance(tridiobject, projection.TriDObject):
+            raise AttributeError('Parametro tridiobject precisa ser objeto da classe TriDObject')
+        self.geometries[name] = tridiobject
+
+    def loadgeometry(self, name, objectpath):
+        """Carrega a geometria do arquivo passado por parametro, em qualquer formato aceito por projection.loadmodel"""
+        self.addgeometry(name, projection.loadmodel(objectpath))
+
+    def addinstance(self, name, geometryname, matrix=None):
+        """Posiciona a geometria geometryname na cena, transformada pela matriz 4x4 matrix (a identidade, se omitida)"""
+        if geometryname not in self.geometries:
+            raise KeyError('Geometria %s nao existe na cena' % geometryname)
+        matrix = numpy.eye(4) if matrix is None else numpy.asarray(matrix, dtype=float).reshape(4, 4)
+        self.instances[name] = (geometryname, matrix)
+
+    def removeinstance(self, name):
+        del self.instances[name]
+
+    def transforminstance(self, name, matrix):
+        """Compoe a matriz 4x4 passada por parametro com a transformacao atual da instancia"""
+        geometryname, current = self.instances[name]
+        self.instances[name] = (geometryname, numpy.asarray(matrix, dtype=float) @ current)
+
+    def translateinstance(self, name, coordinates):
+        """Translada a instancia de acordo com a tupla (x, y, z) passada por parametro"""
+        matrix = numpy.eye(4)
+        matrix[:3, 3] = coordinates
+        self.transforminstance(name, matrix)
+
+    def instancesbygeometry(self):
+        """Agrupa os nomes das instancias pela geometria, mantendo a ordem de insercao"""
+        groups = collections.OrderedDict()
+        for name, (geometryname, matrix) in self.instances.items():
+            groups.setdefault(geometryname, []).append(name)
+        return groups
+
+    def hiddenfacesmask(self, geometry, transforms, pointofview):
+        """Teste de faces ocultas de todas as instancias de uma geometria. transforms eh o tensor (K, 4, 4) das matrizes
+        das instancias; retorna uma matriz booleana (K, F), verdadeira onde a face da instancia esta de costas para o
+        ponto de vista. O ponto de vista eh levado ao espaco de cada instancia, onde as normais da geometria servem sem
+        serem transformadas; o sinal do determinante de cada instancia reproduz o teste feito sobre os vertices ja
+        transformados, pois uma reflexao inverte a orientacao das normais"""
+        viewpoint = numpy.append(numpy.asarray(pointofview, dtype=float), 1.0)
+        local = numpy.linalg.solve(transforms, numpy.broadcast_to(viewpoint, (len(transforms), 4))[:, :, None])[:, :, 0]
+        local = local[:, :3] / local[:, 3:4]
+        normals, offsets = geometry.faceplanes()
+        orientation = numpy.sign(numpy.linalg.det(transforms[:, :3, :3]))
+        return (local @ normals.T - offsets) * orientation[:, None] < 0
+
+    def getprojection(self, pointofview):
+        """Projeta todas as instancias da cena a partir do ponto de vista (X, Y, Z), sobre o plano de projecao de
+        self.camera (Z=0 por padrao), e retorna um unico TriDObject com as faces visiveis de todas elas. As instancias
+        de uma mesma geometria sao projetadas juntas: as matrizes perspectiva * instancia sao empilhadas e aplicadas aos
+        vertices compartilhados em uma unica multiplicacao"""
+        self.camera.setviewpoint(pointofview)
+        perspectivematrix = self.camera.projectionmatrix()
+        names, coords, edges, facenames, faceoffsets, faceindices = [], [], [], [], [], []
+        nvertices = 0
+        nentries = 0
+        for geometryname, instancenames in self.instancesbygeometry().items():
+            geometry = self.geometries[geometryname]
+            transforms = numpy.array([self.instances[name][1] for name in instancenames])
+            count = len(instancenames)
+            n = geometry.nvertices
+
+            visiblefaces = ~ self.hiddenfacesmask(geometry, transforms, pointofview)
+            visiblevertices = geometry.vertexmask(visiblefaces)
+
+            # Somente os vertices visiveis de cada instancia sao multiplicados e divididos por w
+            instance, vertex = numpy.nonzero(visiblevertices)
+            results = numpy.einsum('kij,kj->ki', (perspectivematrix @ transforms)[instance], geometry.coords[vertex])
+            coords.append(results / results[:, 3:4])
+
+            # Indices dos vertices de todas as instancias na projecao, ou -1 para os vertices removidos
+            remap = numpy.full(count * n, -1, dtype=numpy.intp)
+            remap[instance * n + vertex] = numpy.arange(nvertices, nvertices + len(vertex))
+            remap = remap.reshape(count, n)
+
+            # Arestas cujos dois vertices foram mantidos, instancia por instancia
+            edgearray = geometry.edgearray
+            instanceedges = numpy.stack((remap[:, edgearray[:, 0]], remap[:, edgearray[:, 1]]), axis=2).reshape(-1, 2)
+            edges.append(instanceedges[(instanceedges >= 0).all(axis=1)])
+
+            # Faces visiveis de cada instancia, no formato compacto de meshfiles
+            geometryoffsets, geometryindices = geometry.facearrays()
+            lengths = numpy.diff(geometryoffsets)
+            faceinstance, face = numpy.nonzero(visiblefaces)
+            facelengths = lengths[face]
+            position = numpy.arange(facelengths.sum()) - numpy.repeat(numpy.cumsum(facelengths) - facelengths,
+                                                                      facelengths)
+            entries = geometryindices[numpy.repeat(geometryoffsets[face], facelengths) + position]
+            faceindices.append(remap[numpy.repeat(faceinstance, facelengths), entries])
+            faceoffsets.append(nentries + numpy.cumsum(facelengths))
+            nentries += len(entries)
+
+            geometryfacenames = list(geometry.faceindices.keys())
+            names.extend('%s.%s' % (instancenames[k], geometry.names[i])
+                         for k, i in zip(instance.tolist(), vertex.tolist()))
+            facenames.extend('%s.%s' % (instancenames[k], geometryfacenames[f])
+                             for k, f in zip(faceinstance.tolist(), face.tolist()))
+            nvertices += len(vertex)
+
+        self.projection = projection.TriDObject()
+        self.projection.loadfromarrays(names,
+                                       numpy.concatenate(coords) if coords else numpy.zeros((0, 4)),
+                                       numpy.concatenate(edges) if edges else numpy.zeros((0, 2), dtype=numpy.intp),
+                                       facenames,
+                                       numpy.concatenate([[0]] + faceoffsets),
+                                       numpy.concatenate(faceindices) if faceindices else [])
+        return self.projection
+
+    def nbytes(self):
+        """Estimativa do espaco ocupado pela cena, em bytes: as geometrias distintas e uma matriz por instancia"""
+        return sum(geometry.nbytes() for geometry in self.geometries.values()) + len(self.instances) * 16 * 8
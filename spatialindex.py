@@ -0,0 +1,170 @@
+import numpy
+from camera import Camera
+
+__author__ = 'https://github.com/rafaiska'
+
+# Indice espacial das faces de um TriDObject (uma hierarquia de volumes envolventes, BVH) e o tronco de piramide de
+# visao (frustum) de um ponto de vista. A hierarquia permite descartar subarvores inteiras fora do frustum antes de
+# qualquer trabalho por vertice, de modo que o custo da projecao acompanhe a geometria visivel e nao a total.
+
+# Quantidade maxima de faces em uma folha da hierarquia
+LEAFSIZE = 32
+
+# Distancia minima, ao longo da direcao de visao, entre o ponto de vista e a geometria projetada. Pontos mais proximos
+# (ou atras do ponto de vista) teriam w proximo de zero ou com o sinal trocado na divisao homogenea
+NEARDISTANCE = 1e-6
+
+
+class Frustum(object):
+    """Regiao visivel a partir de um ponto de vista, descrita por planos (nx, ny, nz, d): um ponto p esta do lado de
+    dentro de um plano quando nx * px + ny * py + nz * pz + d >= 0. Os planos marcados em strict (o plano proximo) nao
+    podem ser cruzados: uma face so eh aceita se estiver inteiramente do lado de dentro deles"""
+    def __init__(self, planes, strict):
+        self.planes = numpy.asarray(planes, dtype=float).reshape(-1, 4)
+        self.strict = numpy.asarray(strict, dtype=bool)
+
+    @classmethod
+    def fromviewpoint(cls, pointofview, window=None, near=NEARDISTANCE):
+        """Monta o frustum da projecao perspectiva sobre o plano Z=0 a partir de pointofview (ver fromcamera)"""
+        return cls.fromcamera(Camera(pointofview), window, near)
+
+    @classmethod
+    def fromcamera(cls, camera, window=None, near=NEARDISTANCE):
+        """Monta o frustum da projecao perspectiva de camera (um camera.Camera). O plano proximo fica a distancia near
+        do ponto de vista, do lado do plano de projecao. window, se passada, eh uma tupla (xmin, ymin, xmax, ymax) com a
+        janela visivel no plano de projecao, nos eixos u e v do plano (x e y, para o plano Z=0); ela define os quatro
+        planos laterais"""
+        viewpoint = numpy.asarray(camera.viewpoint, dtype=float)
+        normal = numpy.asarray(camera.planenormal, dtype=float)
+        normal = normal / numpy.linalg.norm(normal)
+        origin = numpy.asarray(camera.planepoint, dtype=float)
+        distance = float(normal @ (viewpoint - origin))
+        if distance == 0:
+            raise ValueError('O ponto de vista nao pode estar sobre o plano de projecao')
+        # O lado visivel eh o do plano de projecao: direction aponta do ponto de vista para o plano
+        direction = - normal if distance > 0 else normal
+        planes = [tuple(direction.tolist()) + (- float(direction @ viewpoint) - near,)]
+        strict = [True]
+        if window is not None:
+            xmin, ymin, xmax, ymax = window
+            u, v = camera.axes()
+            corners = numpy.array([origin + x * u + y * v for x, y in ((xmin, ymin), (xmax, ymin), (xmax, ymax),
+                                                                       (xmin, ymax))])
+            center = corners.mean(axis=0)
+            for i in range(4):
+                first, second = corners[i], corners[(i + 1) % 4]
+                sidenormal = numpy.cross(second - first, viewpoint - first)
+                offset = - float(sidenormal @ first)
+                if sidenormal @ center + offset < 0:
+                    sidenormal, offset = - sidenormal, - offset
+                planes.append(tuple(sidenormal.tolist()) + (offset,))
+                strict.append(False)
+        return cls(planes, strict)
+
+    def classify(self, lower, upper):
+        """Classifica caixas alinhadas aos eixos, dadas por matrizes (K, 3) de cantos minimos e maximos. Retorna uma
+        tupla de matrizes booleanas (K,): (outside, inside, strictinside). outside indica caixas inteiramente fora de
+        algum plano; inside, caixas inteiramente dentro de todos; strictinside, inteiramente dentro dos planos strict"""
+        normals = self.planes[:, :3]
+        offsets = self.planes[:, 3]
+        positive = normals > 0
+        # Para cada plano, o canto mais "para dentro" (farthest) e o mais "para fora" (nearest) de cada caixa
+        farthest = numpy.where(positive[None, :, :], upper[:, None, :], lower[:, None, :])
+        nearest = numpy.where(positive[None, :, :], lower[:, None, :], upper[:, None, :])
+        farthest = numpy.einsum('kpi,pi->kp', farthest, normals) + offsets
+        nearest = numpy.einsum('kpi,pi->kp', nearest, normals) + offsets
+        outside = (farthest < 0).any(axis=1)
+        contained = nearest >= 0
+        return outside, contained.all(axis=1), contained[:, self.strict].all(axis=1)
+
+
+class BoundingVolumeHierarchy(object):
+    """Hierarquia de caixas envolventes sobre as faces de uma figura. Cada no cobre um trecho contiguo de
+    self.faceorder, de modo que aceitar um no inteiro eh marcar um intervalo. As faces sao dadas como em meshfiles:
+    faceoffsets (F + 1,) e faceindices (K,), indices das linhas de coords"""
+    def __init__(self, coords, faceoffsets, faceindices, leafsize=LEAFSIZE):
+        faceoffsets = numpy.asarray(faceoffsets, dtype=numpy.intp)
+        faceindices = numpy.asarray(faceindices, dtype=numpy.intp)
+        self.nfaces = len(faceoffsets) - 1
+        xyz = numpy.asarray(coords)[faceindices, :3]
+
+        # Caixa de cada face. Faces vazias recebem uma caixa invertida, que nunca eh aceita
+        self.facelower = numpy.full((self.nfaces, 3), numpy.inf)
+        self.faceupper = numpy.full((self.nfaces, 3), - numpy.inf)
+        nonempty = numpy.flatnonzero(numpy.diff(faceoffsets) > 0)
+        if len(nonempty):
+            self.facelower[nonempty] = numpy.minimum.reduceat(xyz, faceoffsets[nonempty])
+            self.faceupper[nonempty] = numpy.maximum.reduceat(xyz, faceoffsets[nonempty])
+        centroids = (self.facelower + self.faceupper) / 2.0
+
+        self.faceorder = numpy.arange(self.nfaces)
+        starts, ends, children = [], [], []
+        pending = [(0, self.nfaces, -1, 0)]
+        while pending:
+            start, end, parent, side = pending.pop()
+            node = len(starts)
+            if parent >= 0:
+                children[parent][side] = node
+            starts.append(start)
+            ends.append(end)
+            children.append([-1, -1])
+            if end - start <= leafsize:
+                continue
+            # Divide pela mediana dos centroides no eixo de maior extensao
+            segment = self.faceorder[start:end]
+            extent = centroids[segment].max(axis=0) - centroids[segment].min(axis=0)
+            axis = int(numpy.argmax(extent))
+            middle = (end - start) // 2
+            self.faceorder[start:end] = segment[numpy.argpartition(centroids[segment, axis], middle)]
+            pending.append((start, start + middle, node, 0))
+            pending.append((start + middle, end, node, 1))
+
+        self.nodestart = numpy.array(starts, dtype=numpy.intp)
+        self.nodeend = numpy.array(ends, dtype=numpy.intp)
+        self.children = numpy.array(children, dtype=numpy.intp).reshape(-1, 2)
+
+        # Caixas dos nos: as folhas englobam suas faces e os demais nos, seus dois filhos. Como os filhos sempre tem
+        # indice maior que o pai, basta percorrer os nos do ultimo para o primeiro
+        self.nodelower = numpy.full((len(starts), 3), numpy.inf)
+        self.nodeupper = numpy.full((len(starts), 3), - numpy.inf)
+        leaves = numpy.flatnonzero((self.children[:, 0] < 0) & (self.nodeend > self.nodestart))
+        if len(leaves):
+            # As folhas, ordenadas pelo inicio, cobrem faceorder em trechos consecutivos
+            leaves = leaves[numpy.argsort(self.nodestart[leaves])]
+            self.nodelower[leaves] = numpy.minimum.reduceat(self.facelower[self.faceorder], self.nodestart[leaves])
+            self.nodeupper[leaves] = numpy.maximum.reduceat(self.faceupper[self.faceorder], self.nodestart[leaves])
+        for node in numpy.flatnonzero(self.children[:, 0] >= 0)[::-1].tolist():
+            left, right = self.children[node]
+            self.nodelower[node] = numpy.minimum(self.nodelower[left], self.nodelower[right])
+            self.nodeupper[node] = numpy.maximum(self.nodeupper[left], self.nodeupper[right])
+
+    def query(self, frustum):
+        """Retorna uma mascara booleana (F,) com as faces que podem estar visiveis no frustum. A hierarquia eh
+        percorrida por niveis: nos fora do frustum sao descartados com toda a sua subarvore e nos inteiramente dentro
+        sao aceitos sem descer. Nas folhas que cruzam os planos, cada face eh testada individualmente"""
+        accepted = numpy.zeros(self.nfaces + 1, dtype=numpy.intp)
+        active = numpy.zeros(1 if self.nfaces else 0, dtype=numpy.intp)
+        while len(active):
+            outside, inside, strictinside = frustum.classify(self.nodelower[active], self.nodeupper[active])
+            whole = active[inside]
+            # Marca os intervalos aceitos com o truque da soma acumulada: +1 no inicio, -1 no fim
+            numpy.add.at(accepted, self.nodestart[whole], 1)
+            numpy.add.at(accepted, self.nodeend[whole], -1)
+
+            crossing = active[~outside & ~inside]
+            isleaf = self.children[crossing, 0] < 0
+            leaves = crossing[isleaf]
+            if len(leaves):
+                counts = self.nodeend[leaves] - self.nodestart[leaves]
+                positions = numpy.repeat(self.nodestart[leaves] - numpy.cumsum(counts) + counts, counts) + \
+                    numpy.arange(counts.sum())
+                faces = self.faceorder[positions]
+                faceoutside, faceinside, facestrict = frustum.classify(self.facelower[faces], self.faceupper[faces])
+                keep = positions[~faceoutside & facestrict]
+                numpy.add.at(accepted, keep, 1)
+                numpy.add.at(accepted, keep + 1, -1)
+            active = self.children[crossing[~isleaf]].reshape(-1)
+
+        mask = numpy.zeros(self.nfaces, dtype=bool)
+        mask[self.faceorder] = numpy.cumsum(accepted[:-1]) > 0
+        return mask
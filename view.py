@@ -1,37 +1,50 @@
 import tkinter
-import projection
 import math
+import numpy
+import projection
+import animation
+import projectionworker
+from viewport import Viewport
+from instrumentation import NOINSTRUMENTATION
 
 MSCREEN_HEIGHT = 600
 MSCREEN_WIDTH = 800
+ORBIT_FRAMES = 120
+# Intervalo, em milissegundos, das consultas ao resultado da projecao em segundo plano (60 Hz)
+POLL_INTERVAL = 16
+# Rotacao do ponto de vista, em radianos, por pixel arrastado no canvas
+DRAG_RADIANS = 0.01
+# Distancia minima, como fracao da distancia ao centro do modelo, entre o ponto de vista e o modelo no eixo Z
+DRAG_MARGIN = 0.05
 
-def get_minxy(projected):
-    minx = math.inf
-    miny = math.inf
-
-
-    for vertix in projected.vertices:
-        if vertix[1] < minx:
-            minx = vertix[1]
-
-        if vertix[2] < miny:
-            miny = vertix[2]
-
-
-    return minx, miny
-
-def get_maxxy(projected):
-    maxx = - math.inf
-    maxy = - math.inf
 
-    for vertix in projected.vertices:
-        if vertix[1] > maxx:
-            maxx = vertix[1]
+def dragviewpoint(pointofview, center, dx, dy, zlimits=None, radians=DRAG_RADIANS):
+    """Gira o ponto de vista em torno do eixo paralelo a Z que passa por center, como animation.orbitpath: dx pixels
+    arrastados na horizontal giram o ponto de vista mantendo a altura Z e a distancia ao eixo, e dy pixels na vertical
+    mudam a elevacao, mantendo a distancia ao centro. A altura fica sempre do mesmo lado do plano de projecao Z=0 e, se
+    zlimits (zmin, zmax) com o intervalo de Z do modelo for passado, tambem alem do modelo, de modo que o ponto de vista
+    nunca o atravesse"""
+    offsetx = pointofview[0] - center[0]
+    offsety = pointofview[1] - center[1]
+    offsetz = pointofview[2] - center[2]
+    distance = math.sqrt(offsetx * offsetx + offsety * offsety + offsetz * offsetz)
+    if distance == 0.0:
+        return tuple(pointofview)
+    angle = math.atan2(offsety, offsetx) - dx * radians
+    limit = math.pi / 2.0 - 1e-3
+    elevation = max(- limit, min(limit, math.asin(offsetz / distance) - dy * radians))
+    height = center[2] + distance * math.sin(elevation)
 
-        if vertix[2] > maxy:
-            maxy = vertix[2]
+    zmin, zmax = zlimits if zlimits is not None else (0.0, 0.0)
+    margin = DRAG_MARGIN * distance
+    if pointofview[2] >= 0.0:
+        height = max(height, max(zmax, 0.0) + margin)
+    else:
+        height = min(height, min(zmin, 0.0) - margin)
+    # Com a altura limitada, o raio eh ajustado para manter a distancia ao centro
+    radius = math.sqrt(max(distance * distance - (height - center[2]) ** 2, 0.0))
+    return center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle), height
 
-    return maxx, maxy
 
 class InputFrame(tkinter.Frame):
     def __init__(self, root):
@@ -44,6 +57,7 @@ class InputFrame(tkinter.Frame):
         self.labelentryy = tkinter.Label(master=self, text='Y:')
         self.labelentryz = tkinter.Label(master=self, text='Z:')
         self.projectbutton = tkinter.Button(master=self, text='Projetar')
+        self.orbitbutton = tkinter.Button(master=self, text='Orbitar')
         self.entryx.grid(row=0, column=1)
         self.entryy.grid(row=0, column=3)
         self.entryz.grid(row=0, column=5)
@@ -52,8 +66,16 @@ class InputFrame(tkinter.Frame):
         self.labelentryz.grid(row=0, column=4)
         self.projectbutton.grid(row=0, column=6)
         self.projectbutton.bind('<Button-1>', self.projectobject)
+        self.orbitbutton.grid(row=0, column=7)
+        self.orbitbutton.bind('<Button-1>', self.orbitobject)
 
-    def projectobject(self, event):
+        # O modelo eh carregado uma unica vez e mantido durante toda a sessao; as projecoes ja calculadas ficam no
+        # cache. O carregamento e as projecoes sao feitos em segundo plano, pela ProjectionWorker
+        self.projectioncache = projection.ProjectionCache()
+        self.danteprojection = projection.PerspectiveProjection(cache=self.projectioncache)
+        self.worker = projectionworker.ProjectionWorker(self.danteprojection).start()
+
+    def readpointofview(self):
         try:
             projx = float(self.entryx.get())
         except ValueError:
@@ -66,10 +88,40 @@ class InputFrame(tkinter.Frame):
             projz = float(self.entryz.get())
         except ValueError:
             projz = 0.0
-        self.root.canvas.delete('all')
-        danteprojection = projection.PerspectiveProjection()
-        projected = danteprojection.getprojection((projx, projy, projz))
-        mainview.drawprojection(projected)
+        return projx, projy, projz
+
+    def writepointofview(self, pointofview):
+        for entry, value in zip((self.entryx, self.entryy, self.entryz), pointofview):
+            entry.delete(0, tkinter.END)
+            entry.insert(0, '%.3f' % value)
+
+    def modelbounds(self):
+        """Caixa envolvente do modelo, como uma tupla (lower, upper), ou None enquanto ele estiver sendo carregado"""
+        tridiobject = self.danteprojection.tridiobject
+        if not tridiobject:
+            return None
+        return tridiobject.bounds()
+
+    def modelcenter(self):
+        """Centro da caixa envolvente do modelo, ou None enquanto ele estiver sendo carregado"""
+        bounds = self.modelbounds()
+        if bounds is None:
+            return None
+        return tuple((bounds[0] + bounds[1]) / 2.0)
+
+    def projectobject(self, event):
+        self.root.requestprojection(self.readpointofview())
+
+    def orbitobject(self, event):
+        """Anima o ponto de vista em uma orbita em torno do centro do objeto. O raio da orbita eh a distancia do ponto
+        de vista digitado ao eixo Z e a altura eh a sua coordenada Z"""
+        projx, projy, projz = self.readpointofview()
+        center = self.modelcenter()
+        if center is None:
+            return
+        radius = math.hypot(projx - center[0], projy - center[1])
+        path = animation.orbitpath(radius, projz, ORBIT_FRAMES, center)
+        self.root.animate(self.danteprojection, path)
 
 class MainView(tkinter.Tk):
     def __init__(self):
@@ -80,56 +132,181 @@ class MainView(tkinter.Tk):
         self.inputframe = InputFrame(self)
         self.inputframe.pack()
 
-    def drawedge(self, edge):
-        srcx = int(edge[0][1])
-        srcy = int(edge[0][2])
-        dstx = int(edge[1][1])
-        dsty = int(edge[1][2])
-        self.canvas.create_line(srcx, srcy, dstx, dsty, fill="green")
-
-    def drawprojection(self, projected):
-        # achar x e y minimos
-        minx, miny = get_minxy(projected)
+        # Itens persistentes do canvas, um por aresta unica do modelo, identificada pelo par de nomes dos vertices. Os
+        # itens sao criados na primeira vez em que a aresta aparece; nos redesenhos apenas as coordenadas das arestas
+        # que mudaram sao atualizadas e as arestas que deixaram de aparecer sao escondidas
+        self.edgeitems = {}
+        self.edgecoords = {}
+        self.visibleedges = set()
+        # Animacao em andamento. Os quadros sao projetados pela thread de projecao: animationrequests associa o
+        # identificador de cada pedido ainda nao entregue a tupla (animacao, indice do quadro, horario do pedido), e
+        # finishinganimation guarda a animacao cujo caminho terminou, ate que o seu ultimo quadro seja desenhado
+        self.currentanimation = None
+        self.animationrequests = {}
+        self.finishinganimation = None
 
-        # trazer esse retangulo para a origem
-        originprojected = projected.translation((0 - minx, 0 - miny, 0))
+        # Instrumentacao opcional das etapas de drawprojection (ver instrumentation.Instrumentation)
+        self.instrumentation = NOINSTRUMENTATION
 
-        # refletir no plano xz
-        mirrorprojected = originprojected.xzmirror()
+        # Consulta periodica (com after) aos resultados da projecao em segundo plano, ativa enquanto houver pedidos
+        self.polling = None
+        # Arrastar o mouse no canvas gira o ponto de vista em torno do modelo. Os eventos de movimento apenas pedem a
+        # projecao; pedidos feitos enquanto outra projecao eh calculada sao agrupados, e so o mais recente eh desenhado
+        self.dragposition = None
+        self.canvas.bind('<ButtonPress-1>', self.startdrag)
+        self.canvas.bind('<B1-Motion>', self.drag)
+        self.canvas.bind('<ButtonRelease-1>', self.stopdrag)
+        self.protocol('WM_DELETE_WINDOW', self.close)
 
-        # repetir os dois primeiros passos
-        minx, miny = get_minxy(mirrorprojected)
-        originprojected = mirrorprojected.translation((0 - minx, 0 - miny, 0))
+    def requestprojection(self, pointofview, supersede=True):
+        """Pede a projecao a partir de pointofview a thread de projecao, substituindo pedidos anteriores e qualquer
+        animacao em andamento (ver ProjectionWorker.submit). O desenho eh feito por pollprojection, quando o resultado
+        ficar pronto"""
+        if self.currentanimation is not None or self.animationrequests:
+            self.inputframe.worker.cancel()
+        self.currentanimation = None
+        self.animationrequests = {}
+        self.finishinganimation = None
+        self.inputframe.worker.submit(pointofview, supersede)
+        self.startpolling()
 
-        # achar x e y maximos do objeto transladado
-        maxx, maxy = get_maxxy(originprojected)
+    def startpolling(self):
+        if self.polling is None:
+            self.polling = self.after(0, self.pollprojection)
 
-        # verificar taxa de escala
-        xrate = MSCREEN_WIDTH / maxx
-        yrate = MSCREEN_HEIGHT / maxy
-        if xrate > yrate:
-            xrate = yrate
+    def pollprojection(self):
+        worker = self.inputframe.worker
+        finished = worker.result()
+        if finished is not None:
+            requestid, pointofview, projected, error = finished
+            frame = self.animationrequests.pop(requestid, None)
+            # Quadros pedidos antes deste e nao entregues foram agrupados pela thread, ou seja, descartados
+            for skipped in [key for key in self.animationrequests if key < requestid]:
+                self.animationrequests.pop(skipped)[0].stats.dropped += 1
+            if error is not None:
+                print('Erro na projecao: %r' % (error,))
+            elif frame is not None:
+                currentanimation, frameindex, requested = frame
+                currentanimation.present((frameindex, pointofview, projected, currentanimation.clock() - requested))
+            elif projected is not None:
+                self.drawprojection(projected)
+        if self.finishinganimation is not None and not self.animationrequests:
+            print(self.finishinganimation.stats.summary())
+            self.finishinganimation = None
+        if worker.pending():
+            self.polling = self.after(POLL_INTERVAL, self.pollprojection)
         else:
-            yrate = xrate
+            self.polling = None
+
+    def startdrag(self, event):
+        self.dragposition = (event.x, event.y)
+
+    def drag(self, event):
+        bounds = self.inputframe.modelbounds()
+        if self.dragposition is None or bounds is None:
+            return
+        lower, upper = bounds
+        dx = event.x - self.dragposition[0]
+        dy = event.y - self.dragposition[1]
+        self.dragposition = (event.x, event.y)
+        pointofview = dragviewpoint(self.inputframe.readpointofview(), tuple((lower + upper) / 2.0), dx, dy,
+                                   (lower[2], upper[2]))
+        self.inputframe.writepointofview(pointofview)
+        self.requestprojection(pointofview, supersede=False)
+
+    def stopdrag(self, event):
+        self.dragposition = None
+
+    def close(self):
+        self.inputframe.worker.stop(timeout=1.0)
+        self.destroy()
 
-        # mudar escala
-        scaleprojected = originprojected.scale((xrate, yrate, 1.0))
+    def animate(self, projector, path, fps=animation.DEFAULT_FPS):
+        """Anima a projecao ao longo de path (um iteravel de pontos de vista) usando o laco de eventos do Tk. Os quadros
+        sao pedidos no seu horario a thread de projecao e desenhados por pollprojection, de modo que a janela nao fique
+        bloqueada. Quadros atrasados, ou agrupados pela thread por ainda nao terem comecado quando o seguinte foi
+        pedido, sao descartados; ao final, as latencias de projecao (do pedido ao resultado) e de desenho sao exibidas
+        no console"""
+        self.inputframe.worker.cancel()
+        self.animationrequests = {}
+        self.finishinganimation = None
+        self.currentanimation = animation.Animation(projector, path, fps, draw=self.drawprojection)
+        self.after(0, self.animationstep, self.currentanimation, self.currentanimation.schedule())
 
-        # centralizar
-        maxx, maxy = get_maxxy(scaleprojected)
-        if maxx < MSCREEN_WIDTH -1:
-            #print('maxx = %f' % (maxx))
-            scaleprojected = scaleprojected.translation(((MSCREEN_WIDTH - maxx) / 2.0, 0, 0))
-        if maxy < MSCREEN_HEIGHT -1:
-            #print('maxy = %f' % (maxy))
-            scaleprojected = scaleprojected.translation((0, (MSCREEN_HEIGHT - maxy) / 2.0, 0))
+    def animationstep(self, currentanimation, schedule):
+        # Uma nova animacao substitui a anterior
+        if currentanimation is not self.currentanimation:
+            return
+        step = next(schedule, None)
+        if step is None:
+            self.currentanimation = None
+            self.finishinganimation = currentanimation
+            self.startpolling()
+            return
+        frameindex, pointofview = step
+        # Sem supersede: um quadro ja em calculo ainda eh desenhado, mesmo que o seguinte tenha sido pedido
+        requestid = self.inputframe.worker.submit(pointofview, supersede=False)
+        self.animationrequests[requestid] = (currentanimation, frameindex, currentanimation.clock())
+        self.startpolling()
+        delay = currentanimation.deadline(frameindex + 1) - currentanimation.clock()
+        self.after(max(0, int(delay * 1000)), self.animationstep, currentanimation, schedule)
+
+    def clearprojection(self):
+        """Apaga todos os itens do canvas. Deve ser chamado quando o modelo exibido for trocado"""
+        self.canvas.delete('all')
+        self.edgeitems = {}
+        self.edgecoords = {}
+        self.visibleedges = set()
+
+    def drawedge(self, edge):
+        srcx = int(edge[0][0])
+        srcy = int(edge[0][1])
+        dstx = int(edge[1][0])
+        dsty = int(edge[1][1])
+        return self.canvas.create_line(srcx, srcy, dstx, dsty, fill="green")
+
+    def updateedges(self, names, xy, edges):
+        """Sincroniza os itens persistentes do canvas com as arestas passadas por parametro. names sao os nomes dos
+        vertices, xy eh a matriz (N, 2) de coordenadas de tela e edges a matriz (E, 2) de arestas unicas"""
+        # Coordenadas de todas as arestas calculadas de uma vez; o laco abaixo so faz as chamadas ao Tk
+        segments = numpy.trunc(xy[edges].reshape(-1, 4)).astype(int).tolist()
+        visibleedges = set()
+        for (src, dst), coords in zip(edges.tolist(), segments):
+            if names[src] < names[dst]:
+                key = (names[src], names[dst])
+            else:
+                key = (names[dst], names[src])
+                coords = coords[2:] + coords[:2]
+            coords = tuple(coords)
+            visibleedges.add(key)
+            item = self.edgeitems.get(key)
+            if item is None:
+                self.edgeitems[key] = self.drawedge((coords[:2], coords[2:]))
+                self.edgecoords[key] = coords
+                continue
+            if self.edgecoords[key] != coords:
+                self.canvas.coords(item, *coords)
+                self.edgecoords[key] = coords
+            if key not in self.visibleedges:
+                self.canvas.itemconfigure(item, state='normal')
+
+        for key in self.visibleedges - visibleedges:
+            self.canvas.itemconfigure(self.edgeitems[key], state='hidden')
+        self.visibleedges = visibleedges
+
+    def drawprojection(self, projected):
+        instrumentation = self.instrumentation
+        with instrumentation.stage('fitprojection', vertices=projected.nvertices):
+            xy = projected.coords[:, :2]
+            if len(xy):
+                lower, upper = projected.bounds()
+                xy = Viewport.fit(lower, upper, MSCREEN_WIDTH, MSCREEN_HEIGHT).map(xy)
 
         # desenhar arestas
-        drawnedges = [] # para nao desenhar a mesma aresta duas vezes
-        for src, dsts in scaleprojected.edges.items():
-            for dst in dsts:
-                if (dst, src) not in drawnedges:
-                    self.drawedge((scaleprojected.get_vertix(src), scaleprojected.get_vertix(dst)))
+        with instrumentation.stage('updateedges') as stage:
+            self.updateedges(projected.names, xy, projected.edgearray)
+            if instrumentation.enabled:
+                stage.count(edges=len(self.visibleedges), canvasitems=len(self.edgeitems))
 
 if __name__ == "__main__":
     mainview = MainView()
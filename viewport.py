@@ -0,0 +1,86 @@
+import numpy
+
+__author__ = 'https://github.com/rafaiska'
+
+# Transformacao janela-viewport: leva as coordenadas de uma janela (retangulo no plano de projecao) para as coordenadas
+# de um viewport (retangulo no dispositivo, como o canvas do Tk ou uma imagem), com uma unica matriz 3x3 em coordenadas
+# homogeneas (x, y, 1).
+
+
+def finitebounds(points):
+    """Retorna uma tupla (minimos, maximos) com os menores e maiores valores de cada coluna da matriz points,
+    desconsiderando as linhas com coordenadas infinitas ou NaN (vertices projetados com w=0, na profundidade do ponto
+    de vista), para que um unico vertice assim nao estrague o ajuste a tela. Sem nenhuma linha finita, a caixa eh a
+    origem"""
+    finite = numpy.isfinite(points).all(axis=1)
+    if not finite.all():
+        points = points[finite]
+    if not len(points):
+        return numpy.zeros(points.shape[1]), numpy.zeros(points.shape[1])
+    return points.min(axis=0), points.max(axis=0)
+
+
+class Viewport(object):
+    """Mapeamento da janela window = (xwmin, ywmin, xwmax, ywmax) para o viewport viewport = (xvmin, yvmin, xvmax,
+    yvmax). Com flipy, o eixo y eh invertido, ja que nos dispositivos ele cresce para baixo: ywmax vai para yvmin. Com
+    keepaspect, x e y usam a mesma escala (a maior que cabe no viewport) e a janela eh centralizada nele.
+
+    self.matrix eh a matriz 3x3 Tjv da transformacao"""
+    def __init__(self, window, viewport, flipy=True, keepaspect=False):
+        self.window = tuple(float(value) for value in window)
+        self.viewport = tuple(float(value) for value in viewport)
+        xwmin, ywmin, xwmax, ywmax = self.window
+        xvmin, yvmin, xvmax, yvmax = self.viewport
+        windowwidth = xwmax - xwmin
+        windowheight = ywmax - ywmin
+        viewportwidth = xvmax - xvmin
+        viewportheight = yvmax - yvmin
+
+        # Janelas sem largura ou sem altura (todos os pontos alinhados) usam a escala do outro eixo, ou 1
+        xrate = viewportwidth / windowwidth if windowwidth else None
+        yrate = viewportheight / windowheight if windowheight else None
+        if keepaspect:
+            rates = [rate for rate in (xrate, yrate) if rate is not None]
+            xrate = yrate = min(rates) if rates else 1.0
+        else:
+            xrate = 1.0 if xrate is None else xrate
+            yrate = 1.0 if yrate is None else yrate
+
+        # Centraliza a janela escalada quando ela ocupa menos que o viewport (com folga de um pixel)
+        xoffset = 0.0
+        yoffset = 0.0
+        if windowwidth * xrate < viewportwidth - 1:
+            xoffset = (viewportwidth - windowwidth * xrate) / 2.0
+        if windowheight * yrate < viewportheight - 1:
+            yoffset = (viewportheight - windowheight * yrate) / 2.0
+
+        if flipy:
+            yrow = [0.0, - yrate, yvmin + yoffset + yrate * ywmax]
+        else:
+            yrow = [0.0, yrate, yvmin + yoffset - yrate * ywmin]
+        self.matrix = numpy.array([[xrate, 0.0, xvmin + xoffset - xrate * xwmin],
+                                   yrow,
+                                   [0.0, 0.0, 1.0]])
+
+    @classmethod
+    def fit(cls, lower, upper, width, height):
+        """Viewport que ajusta a caixa (lower, upper) do plano de projecao a uma tela de width x height pixels,
+        mantendo a proporcao e centralizando a figura. lower e upper sao os cantos (x, y, ...) minimo e maximo"""
+        return cls((lower[0], lower[1], upper[0], upper[1]), (0, 0, width, height), keepaspect=True)
+
+    def map(self, xy):
+        """Leva a matriz (N, 2) de pontos da janela para as coordenadas do viewport, em uma unica multiplicacao pela
+        matriz 3x3. Retorna uma matriz (N, 2)"""
+        xy = numpy.asarray(xy, dtype=float).reshape(-1, 2)
+        homogeneous = numpy.empty((xy.shape[0], 3))
+        homogeneous[:, :2] = xy
+        homogeneous[:, 2] = 1.0
+        # A ultima linha da matriz eh sempre (0, 0, 1): a coordenada homogenea dos resultados continua sendo 1
+        return (homogeneous @ self.matrix.T)[:, :2]
+
+    def matrix4(self):
+        """A mesma transformacao como matriz 4x4, que mantem z, para ser composta com as transformacoes de TriDObject"""
+        matrix = numpy.eye(4)
+        matrix[:2, :2] = self.matrix[:2, :2]
+        matrix[:2, 3] = self.matrix[:2, 2]
+        return matrix